@@ -0,0 +1,51 @@
+"""
+排行榜图片编码对比：输出各编码方式的体积、base64 后体积与单张生成（绘制 + 编码）耗时。
+
+用法: python benchmarks/bench_encoding.py [--items 10] [--rounds 20]
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.image_generator import RankingImageGenerator
+from bench_render import sample_members
+
+
+# (名称, 编码方式, compress_level)
+MODES = [
+    ("png level 1", "png", 1),
+    ("png level 6", "png", 6),
+    ("png level 9", "png", 9),
+    ("palette level 6", "palette", 6),
+    ("palette level 9", "palette", 9),
+    ("webp lossless", "webp", 6),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    generator = RankingImageGenerator()
+    members = sample_members(args.items)
+
+    print(f"{'mode':<18}{'bytes':>10}{'base64':>10}{'total ms':>12}")
+    for name, image_format, level in MODES:
+        generator.compress_level = level
+        data = generator.generate_ranking_image(members, image_format=image_format)
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            generator.generate_ranking_image(members, image_format=image_format)
+        elapsed = (time.perf_counter() - start) / args.rounds * 1000
+        print(f"{name:<18}{len(data):>10}{(len(data) + 2) // 3 * 4:>10}{elapsed:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+群消息处理开销：对比原先的处理流程（整条消息链字符串化 + 正则 + uuid5）
+与当前只检查消息链开头的快速路径，存储层替换为只收集记录的桩对象。
+
+用法: python benchmarks/bench_handler.py [--messages 100000]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import re
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langbot_plugin.api.entities.builtin.platform import message as platform_message
+
+from components.event_listener.default import DefaultEventListener
+
+
+class _StubDatabase:
+    def __init__(self):
+        self.records = 0
+
+    async def insert_record(self, group_id, user_id, user_name, msg_time, msg_id):
+        self.records += 1
+        return True
+
+    async def ingest(self, record):
+        self.records += 1
+        return True
+
+    def shutdown(self):
+        pass
+
+
+async def legacy_handler(db, event_context):
+    # 优化前的处理流程
+    event = event_context.event
+    message_chain = event.message_chain
+    msg = str(message_chain).strip()
+    group_id = str(event.launcher_id)
+    user_id = str(event.sender_id)
+    user_name = user_id
+    msg_id = str(event.message_id) if hasattr(event, 'message_id') else str(uuid.uuid5(uuid.NAMESPACE_DNS, f"{group_id}_{user_id}_{msg}_{datetime.now().isoformat()}"))
+    msg_time = datetime.now()
+    match = re.match(r'(\d+)日发言榜', msg)
+    if match:
+        return
+    await db.insert_record(group_id=group_id, user_id=user_id, user_name=user_name, msg_time=msg_time, msg_id=msg_id)
+
+
+def sample_events(count: int):
+    now = datetime.now()
+    texts = ["今天吃什么", "哈哈哈哈哈", "有人打游戏吗？晚上八点开黑", "收到", "[图片]"]
+    events = []
+    for i in range(count):
+        chain = platform_message.MessageChain([
+            platform_message.Source(id=i, time=now),
+            platform_message.Plain(text=texts[i % len(texts)]),
+            platform_message.At(target=10000 + i % 7),
+        ])
+        events.append(SimpleNamespace(event=SimpleNamespace(
+            launcher_id=123456 + i % 20,
+            sender_id=10000 + i % 300,
+            message_chain=chain,
+        )))
+    return events
+
+
+async def run(handler, events) -> float:
+    start = time.perf_counter()
+    for event_context in events:
+        await handler(event_context)
+    return (time.perf_counter() - start) / len(events) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100000)
+    args = parser.parse_args()
+
+    events = sample_events(args.messages)
+    legacy_db = _StubDatabase()
+    listener = DefaultEventListener.__new__(DefaultEventListener)
+    listener.db = _StubDatabase()
+
+    legacy = asyncio.run(run(lambda ctx: legacy_handler(legacy_db, ctx), events))
+    fast = asyncio.run(run(listener._on_group_message, events))
+    assert legacy_db.records == listener.db.records == len(events)
+
+    print(f"原处理流程: {legacy:.2f} µs/条")
+    print(f"快速路径:   {fast:.2f} µs/条 ({legacy / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
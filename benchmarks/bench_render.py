@@ -0,0 +1,59 @@
+"""
+排行榜图片渲染微基准：对比使用预渲染底图与每次完整重绘的单张耗时。
+底图只影响绘制，编码耗时单独统计，不计入对比。
+
+用法: python benchmarks/bench_render.py [--items 10] [--rounds 50]
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.image_generator import RankingImageGenerator
+
+
+def sample_members(count: int):
+    return [
+        {"nickname": f"群友{i:02d}号", "qq": str(10000 + i), "count": 500 - i * 13}
+        for i in range(count)
+    ]
+
+
+def _time_ms(fn, rounds: int) -> float:
+    fn()  # 预热
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def bench_draw(generator: RankingImageGenerator, members, rounds: int) -> float:
+    return _time_ms(lambda: generator.draw_ranking_image(members, "今日发言排行榜", "群聊1"), rounds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    generator = RankingImageGenerator()
+    members = sample_members(args.items)
+
+    generator.use_layer_cache = False
+    full = bench_draw(generator, members, args.rounds)
+    generator.use_layer_cache = True
+    layered = bench_draw(generator, members, args.rounds)
+    image = generator.draw_ranking_image(members, "今日发言排行榜", "群聊1")
+    encode = _time_ms(lambda: generator.encode_image(image), args.rounds)
+
+    print(f"绘制（完整重绘）:   {full:.2f} ms/张")
+    print(f"绘制（预渲染底图）: {layered:.2f} ms/张 ({full / layered:.2f}x)")
+    print(f"编码（{generator.image_format}）:    {encode:.2f} ms/张")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+性能基准套件：写入吞吐、排行榜查询延迟随历史数据量的变化、图片绘制与编码耗时。
+
+结果写入 JSON 文件，可用 --compare 与之前的结果逐项对比。
+
+用法:
+    python benchmarks/bench_suite.py [--sizes 10000,100000,1000000] [--output results.json]
+    python benchmarks/bench_suite.py --compare old.json new.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import ChatDatabase
+from utils.image_generator import IMAGE_FORMATS, RankingImageGenerator
+from bench_render import sample_members
+from synthetic import busiest_member, create_database, generate_rows, populate
+
+
+def _summary(samples) -> dict:
+    """毫秒为单位的分位数"""
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+    return {
+        "p50_ms": round(pick(0.50), 4),
+        "p95_ms": round(pick(0.95), 4),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 4),
+    }
+
+
+async def _time_async(fn, rounds: int) -> dict:
+    await fn()  # 预热
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return _summary(samples)
+
+
+def _time_sync(fn, rounds: int) -> dict:
+    fn()  # 预热
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return _summary(samples)
+
+
+async def bench_insert(workdir: Path, count: int) -> dict:
+    """insert_record 吞吐：batch_size=1 时每条单独提交，默认参数为批量写入"""
+    results = {}
+    for name, batch_size, rows in (("single", 1, max(1, count // 10)), ("batched", 200, count)):
+        db = ChatDatabase(str(workdir / f"insert_{name}.db"), batch_size=batch_size)
+        await db._ensure_initialized()
+        records = [
+            (g, u, n, datetime.fromtimestamp(ts), m)
+            for g, u, n, ts, m in generate_rows(rows, seed=7)
+        ]
+        start = time.perf_counter()
+        for group_id, user_id, user_name, msg_time, msg_id in records:
+            await db.insert_record(group_id, user_id, user_name, msg_time, msg_id)
+        await db.flush()
+        elapsed = time.perf_counter() - start
+        await db.close()
+        results[name] = {"rows": rows, "rows_per_s": round(rows / elapsed, 1)}
+    return results
+
+
+async def bench_queries(db_path: str, rounds: int) -> dict:
+    group_id, user_id = busiest_member(db_path)
+    db = ChatDatabase(db_path)
+    results = {}
+    for days in (1, 7, 30, 365):
+        results[f"get_range_ranking_{days}d"] = await _time_async(
+            lambda: db.get_range_ranking(group_id, days=days, limit=10), rounds
+        )
+    for period in ("week", "month", "total"):
+        results[f"get_period_ranking_{period}"] = await _time_async(
+            lambda: db.get_period_ranking(group_id, period, limit=10), rounds
+        )
+    results["get_user_stats"] = await _time_async(
+        lambda: db.get_user_stats(group_id, user_id), rounds
+    )
+    for days in (1, 7, 0):
+        results[f"get_user_rank_{days}d"] = await _time_async(
+            lambda: db.get_user_rank(group_id, user_id, days=days), rounds
+        )
+    await db.close()
+    return results
+
+
+def bench_render(rounds: int, items: int) -> dict:
+    generator = RankingImageGenerator()
+    members = sample_members(items)
+    results = {}
+    for image_format in IMAGE_FORMATS:
+        data = generator.generate_ranking_image(members, image_format=image_format)
+        results[f"generate_{image_format}"] = {
+            **_time_sync(lambda: generator.generate_ranking_image(members, image_format=image_format), rounds),
+            "bytes": len(data),
+        }
+    # 单独统计绘制与编码耗时
+    results["draw"] = _time_sync(lambda: generator.draw_ranking_image(members), rounds)
+    image = generator.draw_ranking_image(members)
+    for image_format in IMAGE_FORMATS:
+        results[f"encode_{image_format}"] = _time_sync(lambda: generator.encode_image(image, image_format), rounds)
+    return results
+
+
+def run_suite(args) -> dict:
+    sizes = sorted(int(s) for s in args.sizes.split(","))
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": {},
+    }
+    results = report["results"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        print("⏱️ insert_record 吞吐...")
+        results["insert"] = asyncio.run(bench_insert(workdir, args.insert_rows))
+
+        # 同一个库逐级追加数据，观察查询延迟随历史增长的变化
+        db_path = str(workdir / "history.db")
+        create_database(db_path)
+        rows = 0
+        for size in sizes:
+            print(f"⏱️ 历史数据 {size} 行...")
+            populate(db_path, size - rows, start=rows, days=args.days)
+            rows = size
+            results[f"query_{size}"] = asyncio.run(bench_queries(db_path, args.rounds))
+
+    print("⏱️ 图片绘制与编码...")
+    results["render"] = bench_render(args.rounds, args.items)
+    return report
+
+
+def _flatten(data: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(old_path: str, new_path: str):
+    old = _flatten(json.loads(Path(old_path).read_text(encoding="utf-8"))["results"])
+    new = _flatten(json.loads(Path(new_path).read_text(encoding="utf-8"))["results"])
+    print(f"{'metric':<48}{'old':>14}{'new':>14}{'ratio':>9}")
+    for key in sorted(old.keys() | new.keys()):
+        a, b = old.get(key), new.get(key)
+        ratio = f"{b / a:.2f}x" if a and b is not None else "-"
+        fmt = lambda v: "-" if v is None else f"{v:.4g}"
+        print(f"{key:<48}{fmt(a):>14}{fmt(b):>14}{ratio:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="逐级增长的历史记录行数，逗号分隔（可加到 10000000）")
+    parser.add_argument("--days", type=int, default=365, help="合成数据覆盖的天数")
+    parser.add_argument("--insert-rows", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--items", type=int, default=10)
+    parser.add_argument("--output", default="benchmarks/results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run_suite(args)
+    Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"✅ 结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+基准测试用的合成发言数据：多个群、多名用户、跨越多天的消息。
+
+用户活跃度服从近似 Zipf 分布（少数人发言很多），时间在 days 天内均匀分布，
+固定随机种子，相同参数总是生成相同的数据。
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import sqlite3
+import sys
+import time
+from datetime import date
+from pathlib import Path
+from typing import Iterator, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import ChatDatabase
+from database.db import write_records_sync
+from database.schema import msg_hash
+
+
+Row = Tuple[str, str, str, int, str]
+
+
+def generate_rows(
+    count: int,
+    groups: int = 50,
+    users_per_group: int = 200,
+    days: int = 365,
+    seed: int = 42,
+    start: int = 0
+) -> Iterator[Row]:
+    """
+    生成 count 条 (group_id, user_id, user_name, ts, msg_id)，
+    start 为起始序号，用于在已有数据之后继续追加且 msg_id 不重复
+    """
+    rng = random.Random(seed + start)
+    # 每个群内按排名 1/k 的权重选择发言人
+    weights = [1 / (k + 1) for k in range(users_per_group)]
+    cum = []
+    total = 0.0
+    for w in weights:
+        total += w
+        cum.append(total)
+
+    end = int(time.time())
+    span = days * 86400
+    for i in range(start, start + count):
+        group = rng.randrange(groups)
+        user = min(users_per_group - 1, _bisect(cum, rng.random() * total))
+        user_id = str(100000 + group * users_per_group + user)
+        yield (
+            f"g{group}",
+            user_id,
+            f"用户{user_id}",
+            end - rng.randrange(span),
+            f"syn{i}"
+        )
+
+
+def _bisect(cum, x) -> int:
+    lo, hi = 0, len(cum)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if cum[mid] < x:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def create_database(db_path: str):
+    """用 ChatDatabase 建表（含迁移与触发器），随后关闭"""
+    async def run():
+        db = ChatDatabase(db_path)
+        await db._ensure_initialized()
+        await db.close()
+    asyncio.run(run())
+
+
+def populate(db_path: str, count: int, start: int = 0, chunk: int = 50000, **kwargs) -> float:
+    """
+    直接用同步连接批量写入 count 条合成记录（触发器同步维护汇总表），
+    返回耗时（秒）。数据量大时比逐条调用 insert_record 快得多
+    """
+    begin = time.perf_counter()
+    db = sqlite3.connect(db_path)
+    try:
+        db.execute('PRAGMA journal_mode = WAL')
+        db.execute('PRAGMA synchronous = OFF')
+        rows = generate_rows(count, start=start, **kwargs)
+        while True:
+            batch = [(g, u, n, ts, msg_hash(m)) for _, (g, u, n, ts, m) in zip(range(chunk), rows)]
+            if not batch:
+                break
+            write_records_sync(db, batch)
+    finally:
+        db.close()
+    return time.perf_counter() - begin
+
+
+def busiest_member(db_path: str) -> Tuple[str, str]:
+    """返回今日发言最多的 (group_id, user_id)，作为查询基准的目标"""
+    today = date.today()
+    db = sqlite3.connect(db_path)
+    try:
+        row = db.execute('''
+            SELECT g.group_id, u.user_id
+            FROM daily_counts d
+            JOIN groups g ON g.group_key = d.group_key
+            JOIN users u ON u.user_key = d.user_key
+            WHERE d.day = ?
+            ORDER BY d.msg_count DESC
+            LIMIT 1
+        ''', (today.year * 10000 + today.month * 100 + today.day,)).fetchone()
+        if row is None:
+            row = db.execute('SELECT g.group_id, u.user_id FROM groups g, users u LIMIT 1').fetchone()
+        return row
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="生成合成发言数据库")
+    parser.add_argument("db_path")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    create_database(args.db_path)
+    elapsed = populate(args.db_path, args.rows, groups=args.groups, users_per_group=args.users, days=args.days)
+    print(f"✅ 已写入 {args.rows} 条记录，用时 {elapsed:.1f}s")
@@ -2,14 +2,15 @@ from __future__ import annotations
 
 import os
 import sys
-import uuid
-import requests
+import time
+import asyncio
 import json
 import re
 import tempfile
-import base64
-from datetime import datetime
+from collections import OrderedDict
+from datetime import date
 from pathlib import Path
+from typing import Optional, Tuple, Union
 
 plugin_dir = Path(__file__).resolve().parent.parent.parent
 sys.path.insert(0, str(plugin_dir))
@@ -20,7 +21,79 @@ from langbot_plugin.api.entities.builtin.platform import message as platform_mes
 from langbot_plugin.api.entities.builtin.provider import message as provider_message
 
 from database import ChatDatabase
-from core.rank_generator import generate_rank_image
+from database.periods import period_start
+from database.retention import RetentionScheduler
+from core.rank_generator import RankImageClient, build_payload
+from core.image_cache import ImageCache
+from core.renderer import RankRenderer
+from core.render_pool import RenderPool
+from core.singleflight import SingleFlight
+from core.throttle import CommandThrottle
+from core.metrics import MetricsReporter, get_metrics
+
+
+# "1日发言榜"、"2日发言榜" 这样的命令格式
+_RANK_COMMAND = re.compile(r'(\d+)日发言榜')
+# "我的发言"（今日）或 "7日我的发言"
+_MY_STATS_COMMAND = re.compile(r'(?:(\d+)日)?我的发言\s*$')
+_STATUS_COMMAND = "运行状态"
+# 自然周期榜单命令及无记录时的提示
+_PERIOD_COMMANDS = {
+    "本周发言榜": "week",
+    "本月发言榜": "month",
+    "总发言榜": "total",
+}
+_PERIOD_EMPTY = {
+    "week": "本周暂无发言记录",
+    "month": "本月暂无发言记录",
+    "total": "暂无发言记录",
+}
+
+_Source = platform_message.Source
+_Plain = platform_message.Plain
+
+
+def parse_command(text: str) -> Optional[Tuple[str, Union[int, str]]]:
+    """
+    解析消息开头的文本，返回 (命令, 参数)，普通聊天返回 None。
+    命令都以数字或固定文字开头，先用首字符排除绝大多数消息
+    """
+    text = text.lstrip()
+    if not text:
+        return None
+    head = text[0]
+    if head.isdigit():
+        match = _RANK_COMMAND.match(text)
+        if match:
+            # 确保天数是正数
+            return ("rank", max(1, int(match.group(1))))
+    if head.isdigit() or head == "我":
+        match = _MY_STATS_COMMAND.match(text)
+        if match:
+            return ("my_stats", max(1, int(match.group(1) or 1)))
+    elif head == _STATUS_COMMAND[0] and text.rstrip() == _STATUS_COMMAND:
+        return ("status", 0)
+    elif head in "本总":
+        period = _PERIOD_COMMANDS.get(text.rstrip())
+        if period is not None:
+            return ("period_rank", period)
+    return None
+
+
+def leading_parts(chain) -> Tuple[Optional[str], Optional[str]]:
+    """
+    只查看消息链开头：返回 (Source 中的消息 ID, 第一个组件为 Plain 时的文本)，
+    不对整条消息链做字符串化
+    """
+    source_id = None
+    for component in chain:
+        if isinstance(component, _Source):
+            source_id = str(component.id)
+            continue
+        if isinstance(component, _Plain):
+            return source_id, component.text
+        break
+    return source_id, None
 
 
 class DefaultEventListener(EventListener):
@@ -32,96 +105,235 @@ class DefaultEventListener(EventListener):
         data_dir.mkdir(parents=True, exist_ok=True)
         db_path = data_dir / "chat_records.db"
         
-        self.db = ChatDatabase(str(db_path))
+        # 超大群的今日榜单由计数索引查询，内存不随群人数增长
+        self.db = ChatDatabase(
+            str(db_path),
+            topk_threshold=int(self.plugin.get_config().get('topk_threshold', 5000) or 0)
+        )
+        # 定期分块清理超过保留天数的发言记录，默认 0 表示永久保留
+        self.retention = RetentionScheduler(
+            self.db,
+            int(self.plugin.get_config().get('retention_days', 0) or 0)
+        )
+        self.retention.start()
+
+        # 运行指标：定期写入 data/metrics.json，管理员可用“运行状态”命令查看
+        self.metrics = get_metrics()
+        self.metrics_reporter = MetricsReporter(
+            self.metrics,
+            data_dir / "metrics.json",
+            interval=float(self.plugin.get_config().get('metrics_interval', 60) or 0)
+        )
+        self.metrics_reporter.start()
+        self.admin_ids = {
+            item.strip()
+            for item in str(self.plugin.get_config().get('admin_ids', '') or '').split(',')
+            if item.strip()
+        }
 
         # 从插件配置中获取值，如果没有则使用默认值
         self.api_url = self.plugin.get_config().get('api_url', '')
         self.access_token = self.plugin.get_config().get('access_token', '')
+        # render_workers 为 0 时在线程中渲染，否则使用独立的渲染进程
+        render_workers = int(self.plugin.get_config().get('render_workers', 1) or 0)
+        self.renderer = RankRenderer(
+            self.plugin.get_config().get('render_backend', 'remote_fallback'),
+            RankImageClient(self.api_url, self.access_token),
+            RenderPool(workers=render_workers) if render_workers > 0 else None,
+            image_format=self.plugin.get_config().get('image_format', 'palette')
+        )
+        self.renderer.start()
+        if self.renderer.pool is not None:
+            self.metrics.gauge("render.pool_pending", lambda: self.renderer.pool.pending)
+        # 成员与计数完全相同的榜单直接复用已生成的图片
+        self.image_cache = ImageCache(
+            ttl=int(self.plugin.get_config().get('image_cache_ttl', 300) or 0),
+            disk_dir=data_dir / "image_cache",
+            image_format=self.renderer.image_format
+        )
+        # 同一群同一天数的并发榜单请求只查询、生成一次
+        self.rank_flights = SingleFlight()
+        # 排行榜命令限流，超出上限时回复最近一次生成的榜单
+        self.rank_throttle = CommandThrottle(
+            group_per_minute=float(self.plugin.get_config().get('rank_group_per_minute', 6) or 0),
+            user_per_minute=float(self.plugin.get_config().get('rank_user_per_minute', 2) or 0)
+        )
+        self._last_replies: OrderedDict = OrderedDict()
         
         @self.handler(events.GroupMessageReceived)
         async def handler(event_context: context.EventContext):
-            event = event_context.event
-            message_chain = event.message_chain
-            msg = str(message_chain).strip()
-            # 获取群聊ID
-            group_id = str(event.launcher_id)
-            # 获取用户信息
-            user_id = str(event.sender_id)
-            user_name = user_id
-            msg_id = str(event.message_id) if hasattr(event, 'message_id') else str(uuid.uuid5(uuid.NAMESPACE_DNS, f"{group_id}_{user_id}_{msg}_{datetime.now().isoformat()}"))
-            msg_time = datetime.now()
-
-            # print(f'event: {event}')
-            # print(f'group_id: {group_id}, user_id: {user_id}, user_name: {user_name}, msg_id: {msg_id}, msg_time: {msg_time}, msg: {msg}')
-            # 解析 "1日发言榜"、"2日发言榜" 这样的命令格式
-            match = re.match(r'(\d+)日发言榜', msg)
-            if match:
-                try:
-                    days = int(match.group(1))
-                    # 确保天数是正数
-                    if days < 1:
-                        days = 1
-                except ValueError:
-                    days = 1
-                
-                await self._handle_rank_command(event_context, group_id, days)
-                event_context.prevent_default()
+            with self.metrics.timer("handler.message"):
+                await self._on_group_message(event_context)
+
+    async def _on_group_message(self, event_context: context.EventContext):
+        event = event_context.event
+        # 获取群聊ID与用户信息
+        group_id = str(event.launcher_id)
+        user_id = str(event.sender_id)
+        source_id, text = leading_parts(event.message_chain.root)
+
+        if text is not None:
+            command = parse_command(text)
+            if command is not None and await self._handle_command(event_context, command, group_id, user_id):
                 return
-            
-            await self.db.insert_record(
-                group_id=group_id,
-                user_id=user_id,
-                user_name=user_name,
-                msg_time=msg_time,
-                msg_id=msg_id
+
+        # 平台未提供消息 ID 时用接收时间生成，此时无法识别重投的消息
+        if source_id is not None:
+            msg_id = f"{group_id}:{source_id}"
+        else:
+            msg_id = f"{group_id}:{user_id}:{time.time_ns()}"
+        await self.db.ingest((group_id, user_id, user_id, int(time.time()), msg_id))
+
+    async def _handle_command(self, event_context: context.EventContext, command: Tuple[str, Union[int, str]], group_id: str, user_id: str) -> bool:
+        """处理命令，返回 False 表示不作为命令处理（按普通消息记录）"""
+        name, arg = command
+        if name in ("rank", "period_rank"):
+            await self._handle_rank_command(event_context, group_id, arg, user_id)
+            return True
+        if name == "my_stats":
+            await self._handle_my_stats_command(event_context, group_id, user_id, arg)
+            return True
+        if name == "status" and user_id in self.admin_ids:
+            await event_context.reply(platform_message.MessageChain([
+                platform_message.Plain(text=self.metrics.format_text())
+            ]))
+            event_context.prevent_default()
+            return True
+        return False
+
+    def __del__(self):
+        # 插件卸载或进程退出时写入尚在队列中的发言记录
+        for task_owner in (getattr(self, 'retention', None), getattr(self, 'metrics_reporter', None)):
+            if task_owner is None:
+                continue
+            try:
+                asyncio.get_running_loop().create_task(task_owner.stop())
+            except RuntimeError:
+                pass
+        db = getattr(self, 'db', None)
+        if db is not None:
+            db.shutdown()
+        renderer = getattr(self, 'renderer', None)
+        if renderer is not None:
+            try:
+                asyncio.get_running_loop().create_task(renderer.close())
+            except RuntimeError:
+                pass
+
+    async def _handle_rank_command(self, event_context: context.EventContext, group_id: str, scope: Union[int, str] = 1, user_id: str = ""):
+        """scope 为天数，或自然周期 week / month / total"""
+        if self.rank_throttle.allow(group_id, user_id):
+            with self.metrics.timer("rank.build"):
+                reply = await self.rank_flights.do(
+                    (group_id, scope),
+                    lambda: self._build_rank_reply(group_id, scope)
+                )
+        else:
+            # 超出频率限制：不查询数据库也不生成图片
+            self.metrics.incr("rank.throttled")
+            reply = self._last_replies.get((group_id, scope))
+            if reply is None:
+                reply = platform_message.MessageChain([
+                    platform_message.Plain(text="查询太频繁了，请稍后再试")
+                ])
+        with self.metrics.timer("rank.reply"):
+            await event_context.reply(reply)
+        event_context.prevent_default()
+
+    async def _handle_my_stats_command(self, event_context: context.EventContext, group_id: str, user_id: str, days: int = 1):
+        stats = await self.db.get_user_stats(group_id, user_id)
+        rank = await self.db.get_user_rank(group_id, user_id, days=days)
+        window = "今日" if days == 1 else f"近{days}日"
+        lines = [
+            "我的发言统计",
+            f"累计发言：{stats['total_msgs']} 条",
+            f"今日发言：{stats['today_msgs']} 条",
+        ]
+        if rank["rank"] is None:
+            lines.append(f"{window}暂无发言，未上榜")
+        else:
+            if days != 1:
+                lines.append(f"{window}发言：{rank['msg_count']} 条")
+            lines.append(
+                f"{window}排名：第 {rank['rank']} 名 / 共 {rank['members']} 人，"
+                f"超过了 {rank['percentile']}% 的群友"
             )
+        await event_context.reply(platform_message.MessageChain([
+            platform_message.Plain(text="\n".join(lines))
+        ]))
+        event_context.prevent_default()
 
-    async def _handle_rank_command(self, event_context: context.EventContext, group_id: str, days: int = 1):
-        ranking_data = await self.db.get_range_ranking(group_id, days=days, limit=10)
+    async def _build_rank_reply(self, group_id: str, scope: Union[int, str]) -> platform_message.MessageChain:
+        if isinstance(scope, str):
+            period, days = scope, 0
+            ranking_data = await self.db.get_period_ranking(group_id, period, limit=10)
+        else:
+            period, days = None, scope
+            ranking_data = await self.db.get_range_ranking(group_id, days=days, limit=10)
         
         if not ranking_data:
+            if period is not None:
+                return platform_message.MessageChain([
+                    platform_message.Plain(text=_PERIOD_EMPTY[period])
+                ])
             if days == 1:
-                await event_context.reply(
-                    platform_message.MessageChain([
-                        platform_message.Plain(text="今日暂无发言记录")
-                    ])
-                )
-            else:
-                await event_context.reply(
-                    platform_message.MessageChain([
-                        platform_message.Plain(text=f"近{days}天暂无发言记录")
-                    ])
-                )
-            return
+                return platform_message.MessageChain([
+                    platform_message.Plain(text="今日暂无发言记录")
+                ])
+            return platform_message.MessageChain([
+                platform_message.Plain(text=f"近{days}天暂无发言记录")
+            ])
         
+        if period is not None:
+            # 远程 API 只接受统计天数，换算为周期第一天（全部历史为最早的记录）到今天的天数
+            today = date.today()
+            start = period_start(period, today) or await self.db.get_first_day(group_id) or today
+            days = (today - start).days + 1
+
         # 准备API请求所需的成员数据
-        members = []
-        for item in ranking_data:
-            members.append({
-                "nickname": item["user_name"],
-                "qq": item["user_id"],
-                "count": item["msg_count"]
+        with self.metrics.timer("rank.payload"):
+            members = []
+            for item in ranking_data:
+                members.append({
+                    "nickname": item["user_name"],
+                    "qq": item["user_id"],
+                    "count": item["msg_count"]
+                })
+            group_name = f"群聊{group_id}"
+            cache_key = ImageCache.make_key({
+                "backend": self.renderer.backend,
+                "format": self.renderer.image_format,
+                "period": period,
+                **build_payload(group_name, days, members)
             })
         
-        # 生成排行榜图片
-        image_content = generate_rank_image(f"群聊{group_id}", days, members, self.api_url, self.access_token)
+        # 生成排行榜图片，相同数据优先使用缓存
+        cached = self.image_cache.get(cache_key)
+        if cached is None:
+            self.metrics.incr("rank.cache_misses")
+            image_content = await self.renderer.render(group_name, days, members, period)
+            if image_content:
+                # 包含 base64 编码
+                with self.metrics.timer("rank.encode"):
+                    cached = self.image_cache.put(cache_key, image_content)
+        else:
+            self.metrics.incr("rank.cache_hits")
         
-        if image_content:
-            # 将图片内容转换为base64编码
-            base64_image = base64.b64encode(image_content).decode('utf-8')
-            
+        if cached is not None:
             # 发送图片
-            await event_context.reply(
-                platform_message.MessageChain([
-                    platform_message.Image(base64=base64_image)
-                ])
-            )
-            event_context.prevent_default()
-        else:
-            # 如果生成图片失败
-            await event_context.reply(
-                platform_message.MessageChain([
-                    platform_message.Plain(text="生成排行榜图片失败，请稍后重试")
-                ])
-            )
-            event_context.prevent_default()
+            reply = platform_message.MessageChain([
+                platform_message.Image(base64=cached.base64)
+            ])
+            self._remember_reply((group_id, scope), reply)
+            return reply
+        # 如果生成图片失败
+        return platform_message.MessageChain([
+            platform_message.Plain(text="生成排行榜图片失败，请稍后重试")
+        ])
+
+    def _remember_reply(self, key, reply: platform_message.MessageChain):
+        # 只保留最近使用的榜单，供限流时直接回复
+        self._last_replies[key] = reply
+        self._last_replies.move_to_end(key)
+        while len(self._last_replies) > 256:
+            self._last_replies.popitem(last=False)
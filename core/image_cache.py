@@ -0,0 +1,129 @@
+import base64
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from utils.image_generator import IMAGE_EXTENSIONS
+
+
+class CachedImage:
+    __slots__ = ("content", "base64", "created")
+
+    def __init__(self, content: bytes, created: Optional[float] = None, encoded: Optional[str] = None):
+        self.content = content
+        # 同时缓存 base64 形式，回复时无需重复编码
+        self.base64 = encoded if encoded is not None else base64.b64encode(content).decode('utf-8')
+        self.created = created if created is not None else time.time()
+
+    @property
+    def size(self) -> int:
+        return len(self.content) + len(self.base64)
+
+
+class ImageCache:
+    """
+    排行榜图片缓存，以请求数据的哈希为键。
+
+    内存层为按字节数限制容量的 LRU；可选的磁盘层保存在 disk_dir 下，
+    重启后仍可命中。两层都按 ttl 秒过期。磁盘文件扩展名由 image_format 决定。
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl: float = 300,
+        disk_dir: Optional[Path] = None,
+        image_format: str = "png"
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.extension = IMAGE_EXTENSIONS.get(image_format, "png")
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+        self._entries: OrderedDict[str, CachedImage] = OrderedDict()
+        self._bytes = 0
+        self._puts = 0
+
+    @staticmethod
+    def make_key(payload) -> str:
+        data = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, created: float) -> bool:
+        return time.time() - created > self.ttl
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.{self.extension}"
+
+    def get(self, key: str) -> Optional[CachedImage]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            if not self._expired(entry.created):
+                self._entries.move_to_end(key)
+                return entry
+            self._remove(key)
+
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            created = path.stat().st_mtime
+            if self._expired(created):
+                path.unlink(missing_ok=True)
+                return None
+            entry = CachedImage(path.read_bytes(), created)
+        except OSError:
+            return None
+        self._store(key, entry)
+        return entry
+
+    def put(self, key: str, content: bytes) -> CachedImage:
+        entry = CachedImage(content)
+        if self.ttl <= 0:
+            return entry
+        self._store(key, entry)
+        if self.disk_dir is not None:
+            try:
+                # 先写临时文件再改名，避免读到写了一半的图片
+                tmp = self.disk_dir / f"{key}.tmp"
+                tmp.write_bytes(content)
+                tmp.replace(self._disk_path(key))
+            except OSError as e:
+                print(f"⚠️ 写入图片缓存失败: {e}")
+            self._puts += 1
+            if self._puts % 100 == 0:
+                self.prune_disk()
+        return entry
+
+    def _store(self, key: str, entry: CachedImage):
+        self._remove(key)
+        if entry.size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def prune_disk(self):
+        """删除磁盘层中已过期的图片"""
+        if self.disk_dir is None:
+            return
+        for path in self.disk_dir.glob(f"*.{self.extension}"):
+            try:
+                if self._expired(path.stat().st_mtime):
+                    path.unlink(missing_ok=True)
+            except OSError:
+                continue
@@ -0,0 +1,194 @@
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import asyncio
+
+
+# 直方图桶上界（秒）：0.05ms 起按 1.5 倍递增，约覆盖到 70s，超出部分计入最后一个桶
+_BUCKET_BOUNDS: List[float] = [0.00005 * 1.5 ** i for i in range(36)]
+
+
+class Histogram:
+    """固定桶的耗时直方图，内存占用与样本数无关，分位数取所在桶的上界"""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(_BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        self.counts[bisect_left(_BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                bound = _BUCKET_BOUNDS[i] if i < len(_BUCKET_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "p50_ms": round(self.percentile(0.50) * 1000, 3),
+            "p95_ms": round(self.percentile(0.95) * 1000, 3),
+            "p99_ms": round(self.percentile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+        }
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    进程内的计数器、耗时直方图与队列深度等即时值。
+
+    gauge 注册为无参函数，只在生成快照时调用。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self.started = time.time()
+
+    def incr(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    def observe(self, name: str, seconds: float):
+        self.histogram(name).record(seconds)
+
+    def timer(self, name: str) -> _Timer:
+        """with metrics.timer("db.query"): ... 记录代码块耗时"""
+        return _Timer(self.histogram(name))
+
+    def gauge(self, name: str, fn: Callable[[], float]):
+        self._gauges[name] = fn
+
+    def snapshot(self) -> dict:
+        gauges = {}
+        for name, fn in list(self._gauges.items()):
+            try:
+                gauges[name] = fn()
+            except Exception:
+                continue
+        return {
+            "timestamp": int(time.time()),
+            "uptime_s": int(time.time() - self.started),
+            "counters": dict(sorted(self.counters.items())),
+            "gauges": dict(sorted(gauges.items())),
+            "latency": {name: h.summary() for name, h in sorted(self.histograms.items())},
+        }
+
+    def format_text(self) -> str:
+        """供聊天命令回复的简要文本"""
+        snap = self.snapshot()
+        lines = [f"运行 {snap['uptime_s'] // 60} 分钟"]
+        lines += [f"{name}: {value}" for name, value in snap["counters"].items()]
+        lines += [f"{name}: {value}" for name, value in snap["gauges"].items()]
+        for name, s in snap["latency"].items():
+            lines.append(f"{name}: n={s['count']} p50={s['p50_ms']}ms p95={s['p95_ms']}ms p99={s['p99_ms']}ms")
+        return "\n".join(lines)
+
+    def write_snapshot(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.snapshot(), ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(path)
+
+
+class MetricsReporter:
+    """每 interval 秒将指标快照写入 JSON 文件"""
+
+    def __init__(self, metrics: Metrics, path: Path, interval: float = 60):
+        self.metrics = metrics
+        self.path = Path(path)
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.metrics.write_snapshot(self.path)
+            except OSError as e:
+                print(f"⚠️ 写入运行指标失败: {e}")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+_metrics: Optional[Metrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """进程内唯一的指标集合"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
+
+
+def timed(name: str):
+    """记录异步函数耗时的装饰器"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with get_metrics().timer(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -1,59 +1,112 @@
-import requests
+import asyncio
 import json
+from typing import Optional
 
-def generate_rank_image(group_name, day_count, members, api_url, access_token):
+import httpx
+
+
+# 伪装 User-Agent
+_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) RankBot/2.0'
+}
+
+
+def build_payload(group_name, day_count, members):
     """
-    生成排行榜图片
+    构造发送给 PHP 的 JSON 数据
     :param group_name: 群名称
     :param day_count: 统计天数
     :param members: 成员列表 [{"nickname": "xxx", "qq": "123", "count": 10}, ...]
-    :param api_url: API 接口地址
-    :param access_token: 访问令牌
-    :return: 图片内容（bytes）或 None
     """
-    
-    # 1. 构造发送给 PHP 的 JSON 数据
-    payload_data = {
+    return {
         "group_name": group_name,
         "day_count": str(day_count), # 确保是字符串
         "list": members
     }
-    
-    # 2. 构造 POST 请求参数（包含 data 和 token）
-    post_params = {
-        "data": json.dumps(payload_data, ensure_ascii=False),
-        "token": access_token
-    }
-    
-    # 3. 设置 User-Agent 伪装
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) RankBot/2.0'
-    }
-    
-    try:
-        print(f"🚀 正在请求服务器生成 [{group_name}] 的 {day_count}日榜单...")
-        
-        # 发送请求
-        response = requests.post(api_url, data=post_params, headers=headers, timeout=30)
-
-        # 4. 处理响应
-        if response.status_code == 200:
-            # 检查返回的内容是否为 PNG 图片头
-            if response.content.startswith(b'\x89PNG'):
-                print("✅ 生成成功！")
-                return response.content
-            else:
-                print("❌ 错误：服务器未返回有效的图片数据。")
-                print("服务器提示:", response.text)
-        elif response.status_code == 403:
-            print("❌ 权限错误：Token 验证失败，请检查 ACCESS_TOKEN 是否正确。")
-        else:
-            print(f"❌ 服务器返回错误状态码: {response.status_code}")
-            print("详情:", response.text)
-            
-    except requests.exceptions.Timeout:
-        print("❌ 请求超时：服务器响应时间过长，请检查网络或减少成员数量。")
-    except Exception as e:
-        print(f"❌ 运行异常: {e}")
-    
-    return None
\ No newline at end of file
+
+
+def _check_response(status_code, content, text):
+    """检查服务器响应，返回图片内容（bytes）或 None"""
+    if status_code == 200:
+        # 检查返回的内容是否为 PNG 图片头
+        if content.startswith(b'\x89PNG'):
+            print("✅ 生成成功！")
+            return content
+        print("❌ 错误：服务器未返回有效的图片数据。")
+        print("服务器提示:", text)
+    elif status_code == 403:
+        print("❌ 权限错误：Token 验证失败，请检查 ACCESS_TOKEN 是否正确。")
+    else:
+        print(f"❌ 服务器返回错误状态码: {status_code}")
+        print("详情:", text)
+    return None
+
+
+class RankImageClient:
+    """
+    异步请求远程 API 生成排行榜图片。
+
+    复用同一个连接池（keep-alive），连接与读取分别设置超时，
+    并限制同时进行中的请求数，避免慢请求阻塞事件循环或堆积。
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        access_token: str,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        max_concurrency: int = 4,
+        max_keepalive: int = 4,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        self.api_url = api_url
+        self.access_token = access_token
+        self._timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(
+            max_connections=max_concurrency,
+            max_keepalive_connections=max_keepalive
+        )
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self._timeout,
+                limits=self._limits,
+                headers=_HEADERS,
+                transport=self._transport
+            )
+        return self._client
+
+    async def generate(self, group_name, day_count, members) -> Optional[bytes]:
+        """
+        生成排行榜图片
+        :return: 图片内容（bytes）或 None
+        """
+        # 构造 POST 请求参数（包含 data 和 token）
+        post_params = {
+            "data": json.dumps(build_payload(group_name, day_count, members), ensure_ascii=False),
+            "token": self.access_token
+        }
+
+        async with self._semaphore:
+            try:
+                print(f"🚀 正在请求服务器生成 [{group_name}] 的 {day_count}日榜单...")
+                response = await self._get_client().post(self.api_url, data=post_params)
+                return _check_response(response.status_code, response.content, response.text)
+            except httpx.ConnectTimeout:
+                print("❌ 连接超时：无法连接到图片生成服务器，请检查网络或 API 地址。")
+            except httpx.TimeoutException:
+                print("❌ 请求超时：服务器响应时间过长，请检查网络或减少成员数量。")
+            except Exception as e:
+                print(f"❌ 运行异常: {e}")
+
+        return None
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
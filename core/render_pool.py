@@ -0,0 +1,218 @@
+import asyncio
+import multiprocessing
+import threading
+from typing import Optional, Set
+
+
+# 工作进程启动后先渲染一张示例图片，字体与底图在接到第一个任务前就已加载
+_WARMUP_MEMBERS = [{"nickname": "预热", "qq": "0", "count": 1}]
+# 启动并预热一个工作进程允许的最长时间
+_STARTUP_TIMEOUT = 60.0
+
+
+def _worker_main(conn):
+    from utils import RankingImageGenerator
+    generator = RankingImageGenerator()
+    generator.generate_ranking_image(_WARMUP_MEMBERS, title="今日发言排行榜", date_str="预热")
+    conn.send(("ready", None))
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        members, title, date_str, image_format = job
+        try:
+            conn.send(("ok", generator.generate_ranking_image(
+                members,
+                title=title,
+                date_str=date_str,
+                image_format=image_format
+            )))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+def _in_thread(fn, *args) -> asyncio.Future:
+    """在守护线程中执行阻塞调用，进程退出时不会等待卡住的管道读取"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(result, error):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def target():
+        result, error = None, None
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            error = e
+        try:
+            loop.call_soon_threadsafe(resolve, result, error)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+    threading.Thread(target=target, daemon=True).start()
+    return future
+
+
+class _Worker:
+    """一个渲染进程及与其通信的管道，同一时间只执行一个任务"""
+
+    __slots__ = ("process", "conn")
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+    @classmethod
+    def spawn(cls, ctx) -> "_Worker":
+        parent, child = ctx.Pipe()
+        process = ctx.Process(target=_worker_main, args=(child,), daemon=True)
+        process.start()
+        child.close()
+        worker = cls(process, parent)
+        try:
+            if not parent.poll(_STARTUP_TIMEOUT):
+                raise TimeoutError(f"渲染进程 {_STARTUP_TIMEOUT}s 内未完成预热")
+            parent.recv()
+        except BaseException:
+            worker.kill()
+            raise
+        return worker
+
+    def call(self, job, timeout: float):
+        # 计时从任务交给空闲的工作进程开始，只包含执行时间
+        self.conn.send(job)
+        if not self.conn.poll(timeout):
+            raise TimeoutError
+        return self.conn.recv()
+
+    def stop(self):
+        """通知进程处理完当前任务后退出，未及时退出时强制结束"""
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(2)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(5)
+        self.conn.close()
+
+
+class RenderPool:
+    """
+    本地渲染进程池。
+
+    Pillow 绘制与 PNG 编码是 CPU 密集型操作，放在独立进程中执行，
+    不与事件循环争抢 GIL。start() 在后台启动工作进程并各自预热一次；
+    同时排队的任务数有上限，job_timeout 只计算任务在工作进程中的执行时间。
+    任务超时或工作进程崩溃时只替换该进程，其余进程与排队的任务不受影响。
+    """
+
+    def __init__(self, workers: int = 1, max_pending: int = 8, job_timeout: float = 20.0):
+        self.workers = max(1, workers)
+        self.job_timeout = job_timeout
+        self._slots = asyncio.Semaphore(max(self.workers, max_pending))
+        # 使用 spawn，避免 fork 时复制数据库连接线程等状态
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._workers: Set[_Worker] = set()
+        self._starting: Set[asyncio.Task] = set()
+        self._closed = False
+        # 排队与执行中的任务数
+        self.pending = 0
+
+    def start(self):
+        """补足工作进程，启动与预热在后台进行；需在事件循环中调用"""
+        self._closed = False
+        for _ in range(self.workers - len(self._workers) - len(self._starting)):
+            task = asyncio.get_running_loop().create_task(self._spawn())
+            self._starting.add(task)
+            task.add_done_callback(self._starting.discard)
+
+    async def wait_ready(self):
+        """等待正在启动的工作进程完成预热"""
+        if self._starting:
+            await asyncio.gather(*self._starting, return_exceptions=True)
+
+    async def _spawn(self):
+        try:
+            worker = await _in_thread(_Worker.spawn, self._ctx)
+        except Exception as e:
+            print(f"❌ 启动渲染进程失败: {e}")
+            # 唤醒一个等待中的任务，使其失败返回而不是一直等待
+            self._idle.put_nowait(None)
+            return
+        if self._closed:
+            worker.kill()
+            return
+        self._workers.add(worker)
+        self._idle.put_nowait(worker)
+
+    def _recycle(self, worker: _Worker):
+        """结束该工作进程并在后台启动一个新的替换它"""
+        self._workers.discard(worker)
+        threading.Thread(target=worker.kill, daemon=True).start()
+        if not self._closed:
+            self.start()
+
+    async def _acquire(self) -> Optional[_Worker]:
+        while True:
+            self.start()
+            worker = await self._idle.get()
+            if worker is None or worker.process.is_alive():
+                return worker
+            # 空闲期间退出的进程直接替换，不让任务因此失败
+            self._recycle(worker)
+
+    async def render(self, members, title, date_str, image_format: Optional[str] = None) -> Optional[bytes]:
+        """在工作进程中生成排行榜图片，失败或超时返回 None"""
+        self.pending += 1
+        try:
+            async with self._slots:
+                worker = await self._acquire()
+                if worker is None:
+                    return None
+                try:
+                    status, result = await _in_thread(
+                        worker.call, (members, title, date_str, image_format), self.job_timeout
+                    )
+                except TimeoutError:
+                    print(f"❌ 本地渲染超时（{self.job_timeout}s），重启该渲染进程")
+                    self._recycle(worker)
+                    return None
+                except (EOFError, OSError):
+                    print("❌ 渲染进程异常退出，重启该渲染进程")
+                    self._recycle(worker)
+                    return None
+                except asyncio.CancelledError:
+                    # 进程仍在执行被取消的任务，结果无法与后续任务区分
+                    self._recycle(worker)
+                    raise
+                self._idle.put_nowait(worker)
+                if status != "ok":
+                    print(f"❌ 本地生成排行榜图片失败: {result}")
+                    return None
+                return result
+        finally:
+            self.pending -= 1
+
+    async def close(self):
+        # 仍在启动的进程完成预热后会看到 _closed 并自行结束
+        self._closed = True
+        workers = list(self._workers)
+        self._workers.clear()
+        if workers:
+            await asyncio.gather(*(_in_thread(worker.stop) for worker in workers), return_exceptions=True)
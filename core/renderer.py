@@ -0,0 +1,125 @@
+import asyncio
+import threading
+from datetime import date, timedelta
+from typing import Optional
+
+from core.metrics import get_metrics
+from core.rank_generator import RankImageClient
+from core.render_pool import RenderPool
+from utils.image_generator import IMAGE_FORMATS, RankingImageGenerator
+
+
+# remote: 仅远程 API；local: 仅本地 Pillow；remote_fallback: 远程失败时改用本地
+RENDER_BACKENDS = ("remote", "local", "remote_fallback")
+
+
+# 自然周期榜单的标题，统计范围仍以天数表示
+PERIOD_TITLES = {
+    "week": "本周发言排行榜",
+    "month": "本月发言排行榜",
+    "total": "总发言排行榜",
+}
+
+
+def local_title(day_count: int, period: Optional[str] = None) -> str:
+    if period is not None:
+        return PERIOD_TITLES[period]
+    return "今日发言排行榜" if day_count <= 1 else f"近{day_count}日发言排行榜"
+
+
+def local_subtitle(group_name: str, day_count: int) -> str:
+    today = date.today()
+    if day_count <= 1:
+        return f"{group_name} · {today:%Y-%m-%d}"
+    start = today - timedelta(days=day_count - 1)
+    return f"{group_name} · {start:%Y-%m-%d} ~ {today:%Y-%m-%d}"
+
+
+class RankRenderer:
+    """
+    按配置选择排行榜图片的生成方式。
+    本地渲染交给 RenderPool 工作进程；未提供进程池时在线程池中执行。
+    """
+
+    def __init__(
+        self,
+        backend: str,
+        client: RankImageClient,
+        pool: Optional[RenderPool] = None,
+        image_format: str = "palette"
+    ):
+        if backend not in RENDER_BACKENDS:
+            print(f"⚠️ 未知的渲染方式 {backend}，改用 remote_fallback")
+            backend = "remote_fallback"
+        self.backend = backend
+        self.client = client
+        self.pool = pool
+        # 本地渲染的输出编码，远程 API 始终返回 PNG
+        if image_format not in IMAGE_FORMATS:
+            print(f"⚠️ 未知的图片格式 {image_format}，改用 palette")
+            image_format = "palette"
+        self.image_format = image_format
+        self._generator = None
+        self._generator_lock = threading.Lock()
+        self._metrics = get_metrics()
+
+    def _get_generator(self):
+        # 字体加载较慢，首次本地渲染时才创建生成器
+        with self._generator_lock:
+            if self._generator is None:
+                self._generator = RankingImageGenerator()
+            return self._generator
+
+    def _render_local_sync(self, group_name, day_count, members, period=None) -> Optional[bytes]:
+        try:
+            return self._get_generator().generate_ranking_image(
+                members,
+                title=local_title(day_count, period),
+                date_str=local_subtitle(group_name, day_count),
+                image_format=self.image_format
+            )
+        except Exception as e:
+            print(f"❌ 本地生成排行榜图片失败: {e}")
+            return None
+
+    async def render_local(self, group_name, day_count, members, period=None) -> Optional[bytes]:
+        with self._metrics.timer("render.local"):
+            if self.pool is not None:
+                return await self.pool.render(
+                    members,
+                    local_title(day_count, period),
+                    local_subtitle(group_name, day_count),
+                    self.image_format
+                )
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._render_local_sync, group_name, day_count, members, period)
+
+    async def render(self, group_name, day_count, members, period: Optional[str] = None) -> Optional[bytes]:
+        """
+        :param members: 成员列表 [{"nickname": "xxx", "qq": "123", "count": 10}, ...]
+        :param period: 自然周期榜单（week / month / total），只影响本地渲染的标题，
+                       远程 API 仍按统计天数显示
+        :return: 图片内容（bytes）或 None
+        """
+        if self.backend == "local":
+            image = await self.render_local(group_name, day_count, members, period)
+        else:
+            with self._metrics.timer("render.remote"):
+                image = await self.client.generate(group_name, day_count, members)
+            if image is None and self.backend == "remote_fallback":
+                print("⚠️ 远程生成失败，改用本地渲染")
+                self._metrics.incr("render.fallbacks")
+                image = await self.render_local(group_name, day_count, members, period)
+        if image is None:
+            self._metrics.incr("render.failures")
+        return image
+
+    def start(self):
+        """预先启动并预热渲染进程，纯远程渲染时不会用到进程池"""
+        if self.pool is not None and self.backend != "remote":
+            self.pool.start()
+
+    async def close(self):
+        await self.client.close()
+        if self.pool is not None:
+            await self.pool.close()
@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: float, rate: float, now: float):
+        self.capacity = capacity
+        # 每秒补充的令牌数
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def full(self, now: float) -> bool:
+        self.refill(now)
+        return self.tokens >= self.capacity
+
+
+class CommandThrottle:
+    """
+    排行榜命令的限流，按群和按群内用户各一个令牌桶。
+
+    每分钟上限同时作为桶容量，允许短时间内集中使用；上限为 0 表示不限制。
+    两个桶都有令牌时才会同时扣除，被拒绝的请求不消耗令牌。
+    """
+
+    def __init__(
+        self,
+        group_per_minute: float = 6,
+        user_per_minute: float = 2,
+        max_buckets: int = 4096,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.group_per_minute = max(0.0, group_per_minute)
+        self.user_per_minute = max(0.0, user_per_minute)
+        self.max_buckets = max_buckets
+        self._clock = clock
+        self._buckets: OrderedDict[Hashable, TokenBucket] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _bucket(self, key: Hashable, per_minute: float, now: float) -> Optional[TokenBucket]:
+        if per_minute <= 0:
+            return None
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(per_minute, per_minute / 60, now)
+            self._buckets[key] = bucket
+            self._prune(now)
+        else:
+            self._buckets.move_to_end(key)
+            bucket.refill(now)
+        return bucket
+
+    def _prune(self, now: float):
+        # 已补满的桶与新建的桶等价，可以直接丢弃
+        while len(self._buckets) > self.max_buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if not bucket.full(now):
+                break
+            del self._buckets[key]
+
+    def allow(self, group_id: str, user_id: str) -> bool:
+        now = self._clock()
+        buckets = [
+            self._bucket(("group", group_id), self.group_per_minute, now),
+            self._bucket(("user", group_id, user_id), self.user_per_minute, now)
+        ]
+        buckets = [b for b in buckets if b is not None]
+        if any(b.tokens < 1 for b in buckets):
+            return False
+        for b in buckets:
+            b.tokens -= 1
+        return True
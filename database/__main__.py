@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+from pathlib import Path
+
+from .db import ChatDatabase
+from .importer import IMPORT_FORMATS, import_file
+
+
+async def _rebuild(db_path: str):
+    db = ChatDatabase(db_path)
+    try:
+        await db.rebuild_rollups()
+        print(f"✅ 已重建 {db_path} 的汇总表")
+    finally:
+        await db.close()
+
+
+async def _import(args):
+    db = ChatDatabase(args.db_path)
+    try:
+        stats = await import_file(
+            db,
+            Path(args.source),
+            fmt=args.format,
+            batch_size=args.batch_size,
+            checkpoint=Path(args.checkpoint) if args.checkpoint else None,
+            resume=not args.restart
+        )
+        print(f"✅ 已导入 {stats['inserted']} 条发言记录到 {args.db_path}")
+    finally:
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m database", description="chatKing 数据库维护工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = sub.add_parser("rebuild", help="根据原始发言记录重建汇总表")
+    rebuild.add_argument("db_path", nargs="?", default="data/chat_records.db")
+
+    importer = sub.add_parser("import", help="导入 JSONL / CSV 格式的历史发言记录，中断后再次运行从断点继续")
+    importer.add_argument("source", help="导出文件，每条记录包含 group_id、user_id、user_name、ts、msg_id")
+    importer.add_argument("db_path", nargs="?", default="data/chat_records.db")
+    importer.add_argument("--format", choices=IMPORT_FORMATS, help="默认按扩展名判断，.csv 以外均按 JSONL 读取")
+    importer.add_argument("--batch-size", type=int, default=100000, help="每个事务写入的记录数")
+    importer.add_argument("--checkpoint", help="进度文件，默认为导出文件旁的 .import.json")
+    importer.add_argument("--restart", action="store_true", help="忽略已有进度，从头开始导入")
+
+    args = parser.parse_args()
+    if args.command == "rebuild":
+        asyncio.run(_rebuild(args.db_path))
+    elif args.command == "import":
+        asyncio.run(_import(args))
+
+
+if __name__ == "__main__":
+    main()
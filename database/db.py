@@ -2,47 +2,293 @@ from __future__ import annotations
 
 import sqlite3
 import aiosqlite
-from datetime import datetime, date, timedelta
-from typing import Optional, List, Dict, Any
+from datetime import datetime, date, time, timedelta
+from typing import Optional, List, Dict, Any, Iterable, Tuple
 from pathlib import Path
+from contextlib import asynccontextmanager
 import asyncio
+import atexit
+
+from core.metrics import get_metrics, timed
+
+from .schema import (
+    DAY_KEY_SQL,
+    PARTITION_LIST_SQL,
+    migrate,
+    month_bounds,
+    month_key,
+    msg_hash,
+    partition_name,
+    partition_table_sql,
+    partition_trigger_sql,
+    rebuild_period_counts,
+    rebuild_rollups,
+    rebuild_user_totals,
+    view_sql,
+)
+from .periods import LEVELS, Span, day_key, period_start, split_range
+from .leaderboard import LiveLeaderboard
+from .dedup import RecentIds
+
+
+# 写入一批记录：先补全 groups / users 维度表，再按文本 ID 查出整数键写入所在月份的分区
+_GROUP_SQL = 'INSERT OR IGNORE INTO groups (group_id) VALUES (?)'
+_USER_SQL = '''
+    INSERT INTO users (user_id, user_name) VALUES (?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET user_name = excluded.user_name
+    WHERE user_name != excluded.user_name
+'''
+_INSERT_SQL = '''
+    INSERT OR IGNORE INTO {table} (group_key, user_key, ts, msg_hash)
+    SELECT g.group_key, u.user_key, ?, ?
+    FROM groups g, users u
+    WHERE g.group_id = ? AND u.user_id = ?
+'''
+
+Record = Tuple[str, str, str, int, int]
+
+
+def _batch_params(batch: List[Record]):
+    groups = [(group_id,) for group_id in dict.fromkeys(record[0] for record in batch)]
+    # 同一用户在批次中以最后一条消息的昵称为准
+    users = list({record[1]: record[2] for record in batch}.items())
+    # 按月份分组，批次通常全部落在当月分区，沿用上一条记录的月份范围即可
+    records: Dict[int, list] = {}
+    rows, start, end = None, 0, 0
+    for group_id, user_id, _, ts, key in batch:
+        if not start <= ts < end:
+            month = month_key(ts)
+            start, end = month_bounds(month)
+            rows = records.setdefault(month, [])
+        rows.append((ts, key, group_id, user_id))
+    return groups, users, records
+
+
+def _partition_ddl(existing: Iterable[int], months: Iterable[int]) -> List[str]:
+    """创建缺失分区（表与触发器）并重建视图的语句，无缺失时为空"""
+    existing = set(existing)
+    missing = sorted(set(months) - existing)
+    ddl = []
+    for month in missing:
+        ddl.append(partition_table_sql(month))
+        ddl.append(partition_trigger_sql(month))
+    if missing:
+        ddl += view_sql(sorted(existing | set(missing)))
+    return ddl
+
+
+def write_records_sync(db: sqlite3.Connection, batch: List[Record]) -> int:
+    """用同步连接在一个事务中写入一批记录，返回实际插入的行数"""
+    groups, users, records = _batch_params(batch)
+    existing = [row[0] for row in db.execute(PARTITION_LIST_SQL)]
+    with db:
+        db.execute('BEGIN IMMEDIATE')
+        for sql in _partition_ddl(existing, records):
+            db.execute(sql)
+        db.executemany(_GROUP_SQL, groups)
+        db.executemany(_USER_SQL, users)
+        return sum(
+            db.executemany(_INSERT_SQL.format(table=partition_name(month)), rows).rowcount
+            for month, rows in records.items()
+        )
+
+
+async def _connect(database: str, **kwargs) -> aiosqlite.Connection:
+    # aiosqlite 的工作线程不是守护线程，长连接未关闭时会阻塞解释器退出，
+    # 并导致 atexit 中的兜底写入永远不会执行
+    conn = aiosqlite.connect(database, **kwargs)
+    getattr(conn, "_thread", conn).daemon = True
+    return await conn
+
+
+# 批量写入失败后的重试间隔（秒）与最大尝试次数
+_RETRY_DELAY = 1.0
+_MAX_WRITE_ATTEMPTS = 3
+
+
+def _day_start(day: date) -> int:
+    """本地时间某天零点的时间戳"""
+    return int(datetime.combine(day, time.min).timestamp())
+
+
+def _window_sql(spans: List[Span]) -> Tuple[str, list]:
+    """
+    汇总各层级计数的子查询，按 user_key 返回区间内的发言数。
+    第一个参数为 group_id，其后为各层级的起止键
+    """
+    parts, params = [], []
+    for level, lo, hi in spans:
+        table, column = LEVELS[level]
+        parts.append(f'SELECT user_key, msg_count FROM {table}, k WHERE {table}.group_key = k.group_key AND {column} BETWEEN ? AND ?')
+        params += [lo, hi]
+    return f'''
+        WITH k AS (SELECT group_key FROM groups WHERE group_id = ?)
+        SELECT user_key, SUM(msg_count) AS msg_count
+        FROM ({' UNION ALL '.join(parts)})
+        GROUP BY user_key
+    ''', params
+
+
+def _rank_result(msg_count: int, above: int, below: int, members: int) -> Dict[str, Any]:
+    return {
+        'msg_count': msg_count,
+        'rank': above + 1 if msg_count else None,
+        'members': members,
+        'percentile': round(below * 100 / members, 1) if members else 0.0,
+    }
 
 
 class ChatDatabase:
-    def __init__(self, db_path: str = "chat_records.db"):
+    def __init__(
+        self,
+        db_path: str = "chat_records.db",
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        max_pending: int = 5000,
+        reader_count: int = 2,
+        synchronous: str = "NORMAL",
+        cache_size: int = -16000,
+        mmap_size: int = 64 * 1024 * 1024,
+        busy_timeout: int = 5000,
+        live_groups: int = 512,
+        dedup_window: int = 10000,
+        topk_threshold: int = 5000
+    ):
+        """
+        :param batch_size: 攒够多少条记录立即写入一次
+        :param flush_interval: 最早一条记录最多等待多少秒被写入
+        :param max_pending: 写入队列上限，队列满时 insert_record 会等待（背压）
+        :param reader_count: 只读连接池大小
+        :param synchronous: PRAGMA synchronous（OFF / NORMAL / FULL / EXTRA）
+        :param cache_size: PRAGMA cache_size，负数表示 KiB
+        :param mmap_size: PRAGMA mmap_size，单位字节，0 表示关闭
+        :param busy_timeout: PRAGMA busy_timeout，单位毫秒
+        :param live_groups: 内存中保留今日榜单的群数量上限
+        :param dedup_window: 内存中记住最近多少条消息 ID，用于在入队前丢弃重投的消息
+        :param topk_threshold: 今日发言人数超过该值的群不在内存中保存榜单，改由计数索引取前几名，0 表示不限制
+        """
+        if synchronous.upper() not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            raise ValueError(f"无效的 synchronous 取值: {synchronous}")
+
         self.db_path = db_path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.reader_count = max(1, reader_count)
+        self.synchronous = synchronous.upper()
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout
         self._init_lock = asyncio.Lock()
         self._initialized = False
 
+        # 写回队列：消息先进入内存队列，由后台任务批量写入
+        self._queue: asyncio.Queue[Record] = asyncio.Queue(
+            maxsize=max(max_pending, self.batch_size)
+        )
+        self._has_pending = asyncio.Event()
+        self._batch_ready = asyncio.Event()
+        self._write_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closed = False
+        # 写入失败的批次及已尝试次数，下次 flush 时优先重试
+        self._retry: List[Tuple[List[Record], int]] = []
+
+        # 长连接：一个写连接 + 若干只读连接（WAL 模式下读写互不阻塞）
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._reader_conns: List[aiosqlite.Connection] = []
+        self._readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+
+        # 今日榜单的内存副本，1日发言榜直接由此返回；超大群不占用内存
+        self._live = LiveLeaderboard(max_groups=live_groups, max_members=topk_threshold)
+        # 已存在的月份分区，写入时据此判断是否需要建表；None 表示需从数据库读取
+        self._partitions: Optional[set] = None
+        # 最近收到的消息 ID 摘要
+        self._recent = RecentIds(dedup_window)
+        # 每次成功写入一批记录后递增，用于判断加载期间是否有新写入
+        self._write_seq = 0
+
+        self._metrics = get_metrics()
+        self._metrics.gauge("db.pending", lambda: self.pending_count)
+
     async def _ensure_initialized(self):
+        if self._closed:
+            raise RuntimeError("数据库已关闭")
         if not self._initialized:
             async with self._init_lock:
                 if not self._initialized:
                     await self._create_table()
+                    self._flush_task = asyncio.create_task(self._flush_loop())
+                    atexit.register(self._flush_pending_sync)
                     self._initialized = True
 
+    async def _apply_pragmas(self, db: aiosqlite.Connection):
+        await db.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout)}')
+        await db.execute(f'PRAGMA synchronous = {self.synchronous}')
+        await db.execute(f'PRAGMA cache_size = {int(self.cache_size)}')
+        await db.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+
     async def _create_table(self):
         db_file = Path(self.db_path)
         db_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS chat_records (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    group_id TEXT NOT NULL,
-                    user_id TEXT NOT NULL,
-                    user_name TEXT NOT NULL,
-                    msg_time TEXT NOT NULL,
-                    msg_id TEXT UNIQUE NOT NULL
-                )
-            ''')
-            await db.execute('''
-                CREATE INDEX IF NOT EXISTS idx_group_time ON chat_records(group_id, msg_time)
-            ''')
-            await db.execute('''
-                CREATE INDEX IF NOT EXISTS idx_msg_id ON chat_records(msg_id)
-            ''')
-            await db.commit()
+
+        self._writer = await _connect(self.db_path)
+        await self._writer.execute('PRAGMA journal_mode = WAL')
+        await self._apply_pragmas(self._writer)
+
+        await migrate(self._writer)
+        # 批量导入中断时分区可能缺少触发器，先恢复再接收新消息
+        await self._restore_partitions()
+
+        # 只读连接需在表结构创建之后打开
+        reader_uri = f"{db_file.resolve().as_uri()}?mode=ro"
+        for _ in range(self.reader_count):
+            reader = await _connect(reader_uri, uri=True)
+            reader.row_factory = sqlite3.Row
+            await self._apply_pragmas(reader)
+            self._reader_conns.append(reader)
+            self._readers.put_nowait(reader)
+
+        await self._seed_live_board()
+
+    async def _seed_live_board(self):
+        """启动时加载今日最活跃的若干个群到内存榜单"""
+        today = day_key(date.today())
+        # 初始化尚未完成，直接使用第一个只读连接
+        db = self._reader_conns[0]
+        # 超大群不逐人加载
+        max_members = self._live.max_members or -1
+        cursor = await db.execute('''
+            SELECT g.group_id, u.user_id, u.user_name, d.msg_count
+            FROM daily_counts d
+            JOIN groups g ON g.group_key = d.group_key
+            JOIN users u ON u.user_key = d.user_key
+            WHERE d.day = ? AND d.group_key IN (
+                SELECT group_key FROM daily_counts
+                WHERE day = ?
+                GROUP BY group_key
+                HAVING ? < 0 OR COUNT(*) <= ?
+                ORDER BY SUM(msg_count) DESC
+                LIMIT ?
+            )
+        ''', (today, today, max_members, max_members, self._live.max_groups))
+        rows = await cursor.fetchall()
+
+        groups: Dict[str, list] = {}
+        for group_id, user_id, user_name, msg_count in rows:
+            groups.setdefault(group_id, []).append((user_id, user_name, msg_count))
+        for group_id, members in groups.items():
+            self._live.load(group_id, today, members)
+
+    @asynccontextmanager
+    async def _reader(self):
+        """从只读连接池中借出一个连接"""
+        if not self._initialized:
+            await self._ensure_initialized()
+        db = await self._readers.get()
+        try:
+            yield db
+        finally:
+            self._readers.put_nowait(db)
 
     async def insert_record(
         self,
@@ -52,48 +298,386 @@ class ChatDatabase:
         msg_time: datetime,
         msg_id: str
     ) -> bool:
-        await self._ensure_initialized()
-        
+        """
+        将记录放入写回队列，由后台任务批量落盘。
+        队列已满时会等待，直到后台任务腾出空间；最近出现过的消息 ID 直接丢弃。
+        返回 False 表示数据库已关闭，记录未被接收。
+        """
+        return await self.ingest((group_id, user_id, user_name, int(msg_time.timestamp()), msg_id))
+
+    async def ingest(self, record: Tuple[str, str, str, int, str]) -> bool:
+        """
+        insert_record 的快速入口，record 为 (group_id, user_id, user_name, ts, msg_id)，
+        ts 为秒级时间戳。队列未满时不会挂起
+        """
+        if self._closed:
+            return False
+        if not self._initialized:
+            await self._ensure_initialized()
+
+        group_id, user_id, user_name, ts, msg_id = record
+        key = msg_hash(msg_id)
+        if self._recent.seen(key):
+            self._metrics.incr("messages.duplicates")
+            return True
+
+        item = (group_id, user_id, user_name, ts, key)
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute('''
-                    INSERT OR IGNORE INTO chat_records 
-                    (group_id, user_id, user_name, msg_time, msg_id)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    group_id,
-                    user_id,
-                    user_name,
-                    msg_time.strftime('%Y-%m-%d %H:%M:%S'),
-                    msg_id
-                ))
-                await db.commit()
-                return True
-        except sqlite3.IntegrityError:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # 背压：等待后台任务腾出空间
+            with self._metrics.timer("db.insert_wait"):
+                await self._queue.put(item)
+        self._has_pending.set()
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+        return True
+
+    @property
+    def pending_count(self) -> int:
+        return self._queue.qsize() + sum(len(batch) for batch, _ in self._retry)
+
+    def _drain(self, limit: int) -> List[Record]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _write_batch(self, batch: List[Record], attempts: int = 0) -> bool:
+        try:
+            groups, users, records = _batch_params(batch)
+            with self._metrics.timer("db.write_batch"):
+                await self._ensure_partitions(records)
+                await self._writer.executemany(_GROUP_SQL, groups)
+                await self._writer.executemany(_USER_SQL, users)
+                inserted = 0
+                for month, rows in records.items():
+                    cursor = await self._writer.executemany(
+                        _INSERT_SQL.format(table=partition_name(month)), rows
+                    )
+                    inserted += cursor.rowcount
+                await self._writer.commit()
+            self._metrics.incr("messages.ingested", inserted)
+            self._metrics.incr("messages.duplicates", len(batch) - inserted)
+            self._apply_live(batch, inserted)
+            return True
+        except asyncio.CancelledError:
+            # 任务被取消时批次可能尚未提交，放回重试列表由关闭流程写入
+            self._retry.append((batch, attempts))
+            raise
+        except Exception as e:
+            try:
+                await self._writer.rollback()
+            except Exception:
+                pass
+            attempts += 1
+            self._metrics.incr("db.write_failures")
+            if attempts >= _MAX_WRITE_ATTEMPTS:
+                print(f"❌ 批量写入 {len(batch)} 条发言记录连续失败 {attempts} 次，已丢弃: {e}")
+            else:
+                print(f"⚠️ 批量写入 {len(batch)} 条发言记录失败，稍后重试: {e}")
+                self._retry.append((batch, attempts))
             return False
 
-    async def get_today_ranking(self, group_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+    async def _partition_months(self) -> List[int]:
+        cursor = await self._writer.execute(PARTITION_LIST_SQL)
+        return [row[0] for row in await cursor.fetchall()]
+
+    async def _ensure_partitions(self, months: Iterable[int]):
+        """按需创建批次涉及的月份分区，需持有写锁"""
+        if self._partitions is not None and self._partitions.issuperset(months):
+            return
+        self._partitions = None
+        existing = await self._partition_months()
+        ddl = _partition_ddl(existing, months)
+        if ddl:
+            await self._writer.execute('BEGIN IMMEDIATE')
+            try:
+                for sql in ddl:
+                    await self._writer.execute(sql)
+                await self._writer.commit()
+            except Exception:
+                await self._writer.rollback()
+                raise
+        self._partitions = set(existing) | set(months)
+
+    async def _restore_partitions(self):
+        """为所有分区补建插入触发器，并让视图包含全部分区"""
+        months = await self._partition_months()
+        await self._writer.execute('BEGIN IMMEDIATE')
+        try:
+            for month in months:
+                await self._writer.execute(partition_trigger_sql(month))
+            for sql in view_sql(months):
+                await self._writer.execute(sql)
+            await self._writer.commit()
+        except Exception:
+            await self._writer.rollback()
+            raise
+
+    @timed("db.import_batch")
+    async def import_batch(self, batch: List[Record]) -> int:
+        """
+        在一个事务中导入一批历史记录，记录格式与写入队列相同，返回实际插入的行数。
+
+        涉及的分区先删除插入触发器，逐行维护的汇总改为导入后一次重建；
+        全部导入后需调用 finish_import 恢复触发器并重建汇总表，在此之前榜单不包含导入的记录
+        """
         await self._ensure_initialized()
-        
-        today = date.today().strftime('%Y-%m-%d')
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = sqlite3.Row
-            cursor = await db.execute('''
-                SELECT 
-                    user_id,
-                    user_name,
-                    COUNT(*) as msg_count
-                FROM chat_records
-                WHERE group_id = ? AND DATE(msg_time) = ?
-                GROUP BY user_id
-                ORDER BY msg_count DESC
+        groups, users, records = _batch_params(batch)
+        async with self._write_lock:
+            # 导入期间新建的分区没有触发器，让写入流程重新读取分区列表
+            self._partitions = None
+            existing = await self._partition_months()
+            missing = sorted(set(records) - set(existing))
+            await self._writer.execute('BEGIN IMMEDIATE')
+            try:
+                for month in missing:
+                    await self._writer.execute(partition_table_sql(month))
+                if missing:
+                    for sql in view_sql(sorted(set(existing) | set(missing))):
+                        await self._writer.execute(sql)
+                for month in records:
+                    await self._writer.execute(f'DROP TRIGGER IF EXISTS trg_{partition_name(month)}_rollup')
+                await self._writer.executemany(_GROUP_SQL, groups)
+                await self._writer.executemany(_USER_SQL, users)
+                inserted = 0
+                for month, rows in records.items():
+                    cursor = await self._writer.executemany(
+                        _INSERT_SQL.format(table=partition_name(month)), rows
+                    )
+                    inserted += cursor.rowcount
+                await self._writer.commit()
+            except Exception:
+                await self._writer.rollback()
+                raise
+        return inserted
+
+    @timed("db.finish_import")
+    async def finish_import(self, chunk_rows: int = 100000, pause: float = 0.05):
+        """
+        批量导入结束后恢复各分区的触发器，并逐月根据原始记录重建汇总表。
+
+        每个月先按 id 分块在临时表中统计，只在替换该月 daily_counts 时短暂占用写锁；
+        随后按群重建周、月与累计计数。插件同时使用该数据库时，
+        其写入只需等待这些短事务，不会因超过 busy_timeout 而被丢弃
+        """
+        await self._ensure_initialized()
+        await self.flush()
+        async with self._write_lock:
+            # 先恢复触发器，统计期间新写入的记录由触发器计数
+            await self._restore_partitions()
+            months = await self._partition_months()
+        for month in months:
+            await self._rebuild_month_counts(month, max(1, chunk_rows), pause)
+        await self._refresh_rollups(pause)
+        self._live.clear()
+
+    async def _rebuild_month_counts(self, month: int, chunk_rows: int, pause: float):
+        """根据该月分区重建其每日计数，统计在临时表中分块进行"""
+        table = partition_name(month)
+        day_sql = DAY_KEY_SQL.format(ts='ts')
+        async with self._write_lock:
+            cursor = await self._writer.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+            max_id = (await cursor.fetchone())[0]
+            await self._writer.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS import_counts (
+                    group_key INTEGER NOT NULL,
+                    day INTEGER NOT NULL,
+                    user_key INTEGER NOT NULL,
+                    msg_count INTEGER NOT NULL,
+                    PRIMARY KEY (group_key, day, user_key)
+                ) WITHOUT ROWID
+            ''')
+            await self._writer.execute('DELETE FROM temp.import_counts')
+            await self._writer.commit()
+
+        # 只写临时表，不占用数据库文件的写锁
+        for start in range(0, max_id, chunk_rows):
+            async with self._write_lock:
+                await self._writer.execute(f'''
+                    INSERT INTO temp.import_counts (group_key, day, user_key, msg_count)
+                    SELECT group_key, {day_sql}, user_key, COUNT(*)
+                    FROM {table}
+                    WHERE id > ? AND id <= ?
+                    GROUP BY 1, 2, 3
+                    ON CONFLICT (group_key, day, user_key) DO UPDATE SET msg_count = msg_count + excluded.msg_count
+                ''', (start, min(start + chunk_rows, max_id)))
+                await self._writer.commit()
+            await asyncio.sleep(pause)
+
+        async with self._write_lock:
+            await self._writer.execute('BEGIN IMMEDIATE')
+            try:
+                await self._writer.execute('''
+                    DELETE FROM daily_counts
+                    WHERE group_key IN (SELECT group_key FROM groups) AND day BETWEEN ? AND ?
+                ''', (month * 100 + 1, month * 100 + 31))
+                await self._writer.execute('''
+                    INSERT INTO daily_counts (group_key, day, user_key, msg_count)
+                    SELECT group_key, day, user_key, msg_count FROM temp.import_counts
+                ''')
+                # 统计开始后写入的记录已由触发器计数但随上面的删除一并清除，在此补回
+                await self._writer.execute(f'''
+                    INSERT INTO daily_counts (group_key, day, user_key, msg_count)
+                    SELECT group_key, {day_sql}, user_key, COUNT(*)
+                    FROM {table}
+                    WHERE id > ?
+                    GROUP BY 1, 2, 3
+                    ON CONFLICT (group_key, day, user_key) DO UPDATE SET msg_count = msg_count + excluded.msg_count
+                ''', (max_id,))
+                await self._writer.execute('DELETE FROM temp.import_counts')
+                await self._writer.commit()
+            except Exception:
+                await self._writer.rollback()
+                raise
+
+    def _apply_live(self, batch: List[Record], inserted: int):
+        self._write_seq += 1
+        if inserted == len(batch):
+            day_keys: Dict[int, int] = {}
+            for group_id, user_id, user_name, ts, _ in batch:
+                # 同一批次通常落在同一分钟内，按分钟缓存日期键
+                minute = ts // 60
+                day = day_keys.get(minute)
+                if day is None:
+                    day = day_keys[minute] = day_key(date.fromtimestamp(ts))
+                self._live.add(group_id, user_id, user_name, day)
+        else:
+            # 批次中有被忽略的重复消息，无法确定哪些行被计数，让相关群重新加载
+            for group_id in {record[0] for record in batch}:
+                self._live.discard(group_id)
+
+    async def flush(self):
+        """将队列中所有待写入的记录立即写入数据库"""
+        async with self._write_lock:
+            retry, self._retry = self._retry, []
+            for batch, attempts in retry:
+                await self._write_batch(batch, attempts)
+            # 出现失败时停止继续出队，剩余记录留在队列中等待下次重试
+            while not self._retry and not self._queue.empty():
+                await self._write_batch(self._drain(self.batch_size))
+            if self._queue.empty() and not self._retry:
+                self._has_pending.clear()
+                self._batch_ready.clear()
+
+    async def _flush_loop(self):
+        try:
+            while True:
+                await self._has_pending.wait()
+                # 未攒满一批时，最多等待 flush_interval 秒
+                if self._queue.qsize() < self.batch_size:
+                    try:
+                        await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                try:
+                    await self.flush()
+                except Exception as e:
+                    print(f"❌ 后台写入任务异常: {e}")
+                if self._retry:
+                    await asyncio.sleep(_RETRY_DELAY)
+        except asyncio.CancelledError:
+            # 事件循环结束（如 asyncio.run 退出）时会取消本任务，
+            # 借此写入剩余记录并关闭连接
+            if not self._closed:
+                self._closed = True
+                self._flush_task = None
+                await self._release()
+            raise
+
+    async def close(self):
+        """停止后台写入任务，写入剩余记录并关闭所有连接"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self._release()
+
+    def shutdown(self):
+        """
+        供 __del__ 等无法 await 的场景调用：
+        事件循环仍在运行时异步关闭，否则同步写入剩余记录
+        """
+        if self._closed:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not None:
+            loop.create_task(self.close())
+        else:
+            self._closed = True
+            self._flush_pending_sync()
+
+    async def _release(self):
+        if self._writer is not None:
+            await self.flush()
+
+        for reader in self._reader_conns:
+            await reader.close()
+        self._reader_conns.clear()
+        self._readers = asyncio.Queue()
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+        self._initialized = False
+
+        # 重试后仍未写入的记录交给同步连接兜底
+        self._flush_pending_sync()
+        atexit.unregister(self._flush_pending_sync)
+
+    def _flush_pending_sync(self):
+        # 进程退出时事件循环可能已停止，使用同步连接写入剩余记录
+        batch = [record for pending, _ in self._retry for record in pending]
+        batch.extend(self._drain(self._queue.qsize()))
+        self._retry = []
+        if not batch:
+            return
+        db = sqlite3.connect(self.db_path)
+        try:
+            write_records_sync(db, batch)
+        except Exception as e:
+            print(f"❌ 退出时写入 {len(batch)} 条发言记录失败: {e}")
+        finally:
+            db.close()
+
+    async def _ranking_between(
+        self,
+        group_id: str,
+        start_day: date,
+        end_day: date,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        # 区间拆成整月、整周与零散日期，分别从对应层级的汇总表取计数，
+        # 按整数键合并后再关联出文本 ID 与昵称
+        spans = split_range(start_day, end_day, date.today())
+        if not spans:
+            return []
+        window, params = _window_sql(spans)
+        async with self._reader() as db:
+            cursor = await db.execute(f'''
+                SELECT u.user_id, u.user_name, d.msg_count
+                FROM ({window}) d
+                JOIN users u ON u.user_key = d.user_key
+                ORDER BY d.msg_count DESC, u.user_id
                 LIMIT ?
-            ''', (group_id, today, limit))
-            
+            ''', [group_id] + params + [limit])
+
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
 
+    async def get_today_ranking(self, group_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        return await self.get_range_ranking(group_id, days=1, limit=limit)
+
+    @timed("db.get_date_range_ranking")
     async def get_date_range_ranking(
         self,
         group_id: str,
@@ -101,32 +685,9 @@ class ChatDatabase:
         end_date: date,
         limit: int = 10
     ) -> List[Dict[str, Any]]:
-        await self._ensure_initialized()
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = sqlite3.Row
-            cursor = await db.execute('''
-                SELECT 
-                    user_id,
-                    user_name,
-                    COUNT(*) as msg_count
-                FROM chat_records
-                WHERE group_id = ? 
-                    AND DATE(msg_time) >= ? 
-                    AND DATE(msg_time) <= ?
-                GROUP BY user_id
-                ORDER BY msg_count DESC
-                LIMIT ?
-            ''', (
-                group_id,
-                start_date.strftime('%Y-%m-%d'),
-                end_date.strftime('%Y-%m-%d'),
-                limit
-            ))
-            
-            rows = await cursor.fetchall()
-            return [dict(row) for row in rows]
+        return await self._ranking_between(group_id, start_date, end_date, limit)
 
+    @timed("db.get_range_ranking")
     async def get_range_ranking(
         self,
         group_id: str,
@@ -139,77 +700,369 @@ class ChatDatabase:
         days=2: 昨天到今天
         days=3: 前天到今天
         """
-        await self._ensure_initialized()
-        
-        # 计算开始日期
-        start_date = (date.today() - timedelta(days=days-1)).strftime('%Y-%m-%d')
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = sqlite3.Row
+        today = date.today()
+        if days <= 1:
+            return await self._live_ranking(group_id, today, limit)
+        return await self.get_date_range_ranking(
+            group_id,
+            today - timedelta(days=days-1),
+            today,
+            limit
+        )
+
+    @timed("db.get_period_ranking")
+    async def get_period_ranking(
+        self,
+        group_id: str,
+        period: str,
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """
+        自然周期的排行榜
+        period='week': 本周（周一到今天）
+        period='month': 本月（1 日到今天）
+        period='total': 全部历史
+        """
+        today = date.today()
+        start = period_start(period, today)
+        if start is not None:
+            return await self._ranking_between(group_id, start, today, limit)
+
+        # 累计计数由触发器维护，按计数排序的索引上直接取前 limit 名
+        async with self._reader() as db:
             cursor = await db.execute('''
-                SELECT 
-                    user_id,
-                    user_name,
-                    COUNT(*) as msg_count
-                FROM chat_records
-                WHERE group_id = ? 
-                    AND DATE(msg_time) >= ?
-                GROUP BY user_id
-                ORDER BY msg_count DESC
+                SELECT u.user_id, u.user_name, t.msg_count
+                FROM user_totals t
+                JOIN users u ON u.user_key = t.user_key
+                WHERE t.group_key = (SELECT group_key FROM groups WHERE group_id = ?)
+                ORDER BY t.msg_count DESC, u.user_id
                 LIMIT ?
-            ''', (
-                group_id,
-                start_date,
-                limit
-            ))
-            
+            ''', (group_id, limit))
             rows = await cursor.fetchall()
             return [dict(row) for row in rows]
 
-    async def delete_old_records(self, days: int = 30) -> int:
-        await self._ensure_initialized()
-        
-        async with aiosqlite.connect(self.db_path) as db:
+    @timed("db.get_first_day")
+    async def get_first_day(self, group_id: str) -> Optional[date]:
+        """群内仍保留的最早一天，没有记录时返回 None"""
+        async with self._reader() as db:
             cursor = await db.execute('''
-                DELETE FROM chat_records
-                WHERE DATE(msg_time) < DATE('now', ?)
-            ''', (f'-{days} days',))
-            await db.commit()
-            return cursor.rowcount
+                SELECT MIN(day) FROM daily_counts
+                WHERE group_key = (SELECT group_key FROM groups WHERE group_id = ?)
+            ''', (group_id,))
+            day = (await cursor.fetchone())[0]
+        if day is None:
+            return None
+        return date(day // 10000, day // 100 % 100, day % 100)
 
-    async def record_exists(self, msg_id: str) -> bool:
+    async def _live_ranking(self, group_id: str, today: date, limit: int) -> List[Dict[str, Any]]:
+        day = day_key(today)
+        ranking = self._live.top(group_id, day, limit)
+        if ranking is not None:
+            return ranking
+        if self._live.is_large(group_id, day):
+            return await self._indexed_ranking(group_id, day, limit)
+
+        seq = self._write_seq
+        max_members = self._live.max_members
+        async with self._reader() as db:
+            # 多取一行即可判断是否为超大群，无需完整读取
+            cursor = await db.execute('''
+                SELECT u.user_id, u.user_name, d.msg_count
+                FROM daily_counts d
+                JOIN users u ON u.user_key = d.user_key
+                WHERE d.group_key = (SELECT group_key FROM groups WHERE group_id = ?)
+                  AND d.day = ?
+                LIMIT ?
+            ''', (group_id, day, max_members + 1 if max_members else -1))
+            rows = await cursor.fetchall()
+
+        self._live.load(group_id, day, [tuple(row) for row in rows])
+        if self._live.is_large(group_id, day):
+            return await self._indexed_ranking(group_id, day, limit)
+        ranking = self._live.top(group_id, day, limit)
+        if seq != self._write_seq:
+            # 加载期间有新批次写入，本次结果可用但不保留在内存中
+            self._live.discard(group_id)
+        return ranking
+
+    async def _indexed_ranking(self, group_id: str, day: int, limit: int) -> List[Dict[str, Any]]:
+        """
+        超大群的今日榜单：在按计数排序的索引上找到第 limit 名的计数，
+        只读取不低于该计数的条目，计数相同时与内存榜单一样按 user_id 排序
+        """
+        self._metrics.incr("rank.indexed")
+        async with self._reader() as db:
+            cursor = await db.execute('''
+                SELECT u.user_id, u.user_name, d.msg_count
+                FROM daily_counts d
+                JOIN users u ON u.user_key = d.user_key
+                WHERE d.group_key = (SELECT group_key FROM groups WHERE group_id = ?)
+                  AND d.day = ?
+                  AND d.msg_count >= COALESCE((
+                      SELECT msg_count FROM daily_counts
+                      WHERE group_key = (SELECT group_key FROM groups WHERE group_id = ?)
+                        AND day = ?
+                      ORDER BY msg_count DESC
+                      LIMIT 1 OFFSET ?
+                  ), 0)
+                ORDER BY d.msg_count DESC, u.user_id
+                LIMIT ?
+            ''', (group_id, day, group_id, day, max(0, limit - 1), limit))
+            rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
+    @timed("db.rebuild_rollups")
+    async def rebuild_rollups(self):
+        """根据原始记录重建各级汇总表"""
         await self._ensure_initialized()
-        
-        async with aiosqlite.connect(self.db_path) as db:
+        await self.flush()
+
+        async with self._write_lock:
+            await self._writer.execute('BEGIN IMMEDIATE')
+            try:
+                await rebuild_rollups(self._writer)
+                await self._writer.commit()
+            except Exception:
+                await self._writer.rollback()
+                raise
+            finally:
+                self._live.clear()
+
+    @timed("db.delete_old_records")
+    async def delete_old_records(
+        self,
+        days: int = 30,
+        chunk_size: int = 500,
+        pause: float = 0.05
+    ) -> int:
+        """
+        删除 days 天之前的发言记录及其每日计数，返回删除的原始记录数。
+
+        整月过期的分区直接删除整张表；截止日期所在月份的分区与每日计数
+        每次只在写锁内删除 chunk_size 行并立即提交，块之间让出写锁，
+        后台写入任务可以穿插执行，清理期间新消息的写入不会被长时间阻塞。
+        最后分批回收空闲页面。
+        """
+        await self._ensure_initialized()
+
+        cutoff = date.today() - timedelta(days=days)
+        cutoff_ts = _day_start(cutoff)
+        chunk_size = max(1, chunk_size)
+
+        # 先删除汇总，过期日期不会出现在榜单中却缺少原始记录
+        expired_days = await self._delete_chunks('''
+            DELETE FROM daily_counts
+            WHERE (group_key, day, user_key) IN (
+                SELECT group_key, day, user_key FROM daily_counts
+                WHERE day < ?
+                LIMIT ?
+            )
+        ''', (day_key(cutoff),), chunk_size, pause)
+        if expired_days:
+            await self._refresh_rollups(pause)
+
+        async with self._write_lock:
+            months = await self._partition_months()
+        expired = [m for m in months if month_bounds(m)[1] <= cutoff_ts]
+        deleted = await self._drop_partitions(expired)
+
+        # 截止日期所在月份的分区只删除其中过期的部分
+        boundary = month_key(cutoff_ts)
+        if boundary in months and month_bounds(boundary)[0] < cutoff_ts:
+            table = partition_name(boundary)
+            # 在只读连接上确定需要删除的最大 id，之后每块只扫描这个范围
+            async with self._reader() as db:
+                cursor = await db.execute(f'SELECT MAX(id) FROM {table} WHERE ts < ?', (cutoff_ts,))
+                max_id = (await cursor.fetchone())[0]
+            if max_id is not None:
+                deleted += await self._delete_chunks(f'''
+                    DELETE FROM {table}
+                    WHERE id IN (
+                        SELECT id FROM {table}
+                        WHERE id <= ? AND ts < ?
+                        ORDER BY id
+                        LIMIT ?
+                    )
+                ''', (max_id, cutoff_ts), chunk_size, pause)
+
+        if cutoff >= date.today():
+            self._live.clear()
+
+        await self.incremental_vacuum(pause=pause)
+        return deleted
+
+    async def _refresh_rollups(self, pause: float):
+        """按群逐个根据 daily_counts 重新计算周、月与累计计数，群之间让出写锁"""
+        async with self._reader() as db:
+            cursor = await db.execute('SELECT group_key FROM groups')
+            group_keys = [row[0] for row in await cursor.fetchall()]
+        for group_key in group_keys:
+            async with self._write_lock:
+                await self._writer.execute('BEGIN IMMEDIATE')
+                try:
+                    await rebuild_user_totals(self._writer, group_key)
+                    await rebuild_period_counts(self._writer, group_key)
+                    await self._writer.commit()
+                except Exception:
+                    await self._writer.rollback()
+                    raise
+            await asyncio.sleep(pause)
+
+    async def _drop_partitions(self, expired: List[int]) -> int:
+        if not expired:
+            return 0
+        deleted = 0
+        async with self._reader() as db:
+            for month in expired:
+                cursor = await db.execute(f'SELECT COUNT(*) FROM {partition_name(month)}')
+                deleted += (await cursor.fetchone())[0]
+        async with self._write_lock:
+            self._partitions = None
+            # 统计期间写入任务可能新建了分区（如跨月），视图按锁内的分区列表重建
+            remaining = [m for m in await self._partition_months() if m not in expired]
+            await self._writer.execute('BEGIN IMMEDIATE')
+            try:
+                # 先让视图不再引用这些分区，再删除分区表
+                for sql in view_sql(remaining):
+                    await self._writer.execute(sql)
+                for month in expired:
+                    await self._writer.execute(f'DROP TABLE {partition_name(month)}')
+                await self._writer.commit()
+            except Exception:
+                await self._writer.rollback()
+                raise
+        return deleted
+
+    async def _delete_chunks(self, sql: str, params: tuple, chunk_size: int, pause: float) -> int:
+        total = 0
+        while True:
+            async with self._write_lock:
+                cursor = await self._writer.execute(sql, params + (chunk_size,))
+                count = cursor.rowcount
+                await self._writer.commit()
+            total += count
+            if count < chunk_size:
+                return total
+            await asyncio.sleep(pause)
+
+    async def incremental_vacuum(self, pages: int = 1000, pause: float = 0.05) -> int:
+        """每次最多回收 pages 个空闲页面，直到空闲列表为空，返回回收的页面数"""
+        await self._ensure_initialized()
+        freed = 0
+        while True:
+            async with self._write_lock:
+                cursor = await self._writer.execute('PRAGMA freelist_count')
+                free = (await cursor.fetchone())[0]
+                if free == 0:
+                    return freed
+                # 每返回一行回收一个页面，必须读完结果才会全部执行
+                cursor = await self._writer.execute(f'PRAGMA incremental_vacuum({int(pages)})')
+                await cursor.fetchall()
+                await self._writer.commit()
+            freed += min(free, pages)
+            await asyncio.sleep(pause)
+
+    @timed("db.record_exists")
+    async def record_exists(self, msg_id: str) -> bool:
+        async with self._reader() as db:
             cursor = await db.execute(
-                'SELECT 1 FROM chat_records WHERE msg_id = ?',
-                (msg_id,)
+                'SELECT 1 FROM chat_records WHERE msg_hash = ?',
+                (msg_hash(msg_id),)
             )
             return await cursor.fetchone() is not None
 
+    @timed("db.get_user_stats")
     async def get_user_stats(self, group_id: str, user_id: str) -> Dict[str, Any]:
-        await self._ensure_initialized()
+        """累计与今日发言数，均为汇总表上的主键查询"""
+        today = date.today()
         
-        today = date.today().strftime('%Y-%m-%d')
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = sqlite3.Row
-            
+        async with self._reader() as db:
             cursor = await db.execute('''
-                SELECT COUNT(*) as total_msgs
-                FROM chat_records
-                WHERE group_id = ? AND user_id = ?
-            ''', (group_id, user_id))
-            total_row = await cursor.fetchone()
-            
-            cursor = await db.execute('''
-                SELECT COUNT(*) as today_msgs
-                FROM chat_records
-                WHERE group_id = ? AND user_id = ? AND DATE(msg_time) = ?
-            ''', (group_id, user_id, today))
-            today_row = await cursor.fetchone()
+                SELECT
+                    COALESCE((
+                        SELECT msg_count FROM user_totals
+                        WHERE group_key = k.group_key AND user_key = k.user_key
+                    ), 0) AS total_msgs,
+                    COALESCE((
+                        SELECT msg_count FROM daily_counts
+                        WHERE group_key = k.group_key AND day = ? AND user_key = k.user_key
+                    ), 0) AS today_msgs
+                FROM (
+                    SELECT
+                        (SELECT group_key FROM groups WHERE group_id = ?) AS group_key,
+                        (SELECT user_key FROM users WHERE user_id = ?) AS user_key
+                ) k
+            ''', (day_key(today), group_id, user_id))
+            row = await cursor.fetchone()
             
             return {
-                'total_msgs': total_row['total_msgs'] if total_row else 0,
-                'today_msgs': today_row['today_msgs'] if today_row else 0
+                'total_msgs': row['total_msgs'],
+                'today_msgs': row['today_msgs']
             }
+
+    @timed("db.get_user_rank")
+    async def get_user_rank(self, group_id: str, user_id: str, days: int = 1) -> Dict[str, Any]:
+        """
+        用户在近 days 天（days=0 表示全部历史）群内发言数的排名。
+
+        今日与全部历史由内存榜单或按计数排序的索引得出，只需统计计数更高的条目；
+        其余天数拆成整月、整周与零散日期，汇总各层级的计数。
+        返回 msg_count、rank（无发言时为 None）、members（窗口内有发言的人数）
+        与 percentile（发言数少于该用户的成员占比，百分数）
+        """
+        today = date.today()
+        if days == 1:
+            result = self._live.rank(group_id, day_key(today), user_id)
+            if result is not None:
+                return _rank_result(*result)
+
+        async with self._reader() as db:
+            if days == 1 or days <= 0:
+                table, window, params = (
+                    ('user_totals', '', ()) if days <= 0
+                    else ('daily_counts', 'AND day = ?', (day_key(today),))
+                )
+                cursor = await db.execute(f'''
+                    WITH k AS (
+                        SELECT
+                            (SELECT group_key FROM groups WHERE group_id = ?) AS group_key,
+                            (SELECT user_key FROM users WHERE user_id = ?) AS user_key
+                    ),
+                    me AS (
+                        SELECT COALESCE((
+                            SELECT msg_count FROM {table}, k
+                            WHERE {table}.group_key = k.group_key {window}
+                              AND {table}.user_key = k.user_key
+                        ), 0) AS msg_count
+                    )
+                    SELECT
+                        me.msg_count,
+                        (SELECT COUNT(*) FROM {table}, k
+                         WHERE {table}.group_key = k.group_key {window}
+                           AND {table}.msg_count > me.msg_count) AS above,
+                        (SELECT COUNT(*) FROM {table}, k
+                         WHERE {table}.group_key = k.group_key {window}
+                           AND {table}.msg_count < me.msg_count) AS below,
+                        (SELECT COUNT(*) FROM {table}, k
+                         WHERE {table}.group_key = k.group_key {window}) AS members
+                    FROM me
+                ''', (group_id, user_id) + params * 4)
+            else:
+                window, params = _window_sql(split_range(today - timedelta(days=days - 1), today, today))
+                cursor = await db.execute(f'''
+                    WITH totals AS ({window}),
+                    me AS (
+                        SELECT COALESCE((
+                            SELECT msg_count FROM totals
+                            WHERE user_key = (SELECT user_key FROM users WHERE user_id = ?)
+                        ), 0) AS msg_count
+                    )
+                    SELECT
+                        me.msg_count,
+                        (SELECT COUNT(*) FROM totals WHERE msg_count > me.msg_count) AS above,
+                        (SELECT COUNT(*) FROM totals WHERE msg_count < me.msg_count) AS below,
+                        (SELECT COUNT(*) FROM totals) AS members
+                    FROM me
+                ''', [group_id] + params + [user_id])
+            row = await cursor.fetchone()
+        return _rank_result(row[0], row[1], row[2], row[3])
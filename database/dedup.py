@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Hashable
+
+
+class RecentIds:
+    """
+    最近出现过的消息 ID 集合，容量固定，超出时淘汰最久未出现的 ID。
+
+    平台重投的事件通常在短时间内到达，在进入写入队列前即可拦下；
+    窗口之外的重复消息仍由数据库的唯一索引兜底。
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = max(1, capacity)
+        self._ids: OrderedDict[Hashable, None] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._ids
+
+    def seen(self, key: Hashable) -> bool:
+        """key 已在窗口内时返回 True，否则记录下来并返回 False"""
+        if key in self._ids:
+            self._ids.move_to_end(key)
+            return True
+        self._ids[key] = None
+        if len(self._ids) > self.capacity:
+            self._ids.popitem(last=False)
+        return False
+
+    def clear(self):
+        self._ids.clear()
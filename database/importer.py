@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import json
+import time
+from datetime import datetime
+from itertools import islice
+from operator import itemgetter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .db import ChatDatabase, Record
+from .schema import msg_hash
+
+
+# 导出文件中每条记录包含 group_id、user_id、user_name、ts、msg_id，
+# user_name 缺省时使用 user_id，msg_id 缺省时由记录位置生成；时间字段可用以下任一名称
+_TIME_FIELDS = ("ts", "time", "msg_time", "timestamp")
+
+IMPORT_FORMATS = ("jsonl", "csv")
+
+
+def parse_time(value: Any) -> int:
+    """秒或毫秒时间戳、数字字符串或 ISO 8601 时间（无时区时按本地时间）转为秒级时间戳"""
+    if isinstance(value, str):
+        value = value.strip()
+        try:
+            value = float(value)
+        except ValueError:
+            return int(datetime.fromisoformat(value).timestamp())
+    ts = int(value)
+    # 13 位为毫秒时间戳
+    return ts // 1000 if ts > 10 ** 11 else ts
+
+
+def to_record(item: Dict[str, Any], index: int) -> Record:
+    """导出文件中的一条记录转为写入队列格式，index 为记录在文件中的序号"""
+    group_id = str(item["group_id"])
+    user_id = str(item["user_id"])
+    ts = parse_time(next(item[f] for f in _TIME_FIELDS if item.get(f) not in (None, "")))
+    # 没有消息 ID 的导出以记录位置生成，重复导入同一文件时仍能去重
+    msg_id = item.get("msg_id") or f"{group_id}:{user_id}:{ts}:{index}"
+    return (group_id, user_id, str(item.get("user_name") or user_id), ts, msg_hash(str(msg_id)))
+
+
+def read_jsonl(path: Path, skip: int = 0) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """逐行读取 JSONL，返回 (序号, 记录)，无法解析的行记录为 None；跳过的行不做解析"""
+    with open(path, encoding="utf-8") as f:
+        for index, line in enumerate(islice(f, skip, None), start=skip):
+            if not line.strip():
+                yield index, None
+                continue
+            try:
+                yield index, json.loads(line)
+            except ValueError:
+                yield index, None
+
+
+def read_csv(path: Path, skip: int = 0) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """逐行读取带表头的 CSV，返回 (序号, 记录)，序号不含表头"""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        for index, row in enumerate(islice(reader, skip, None), start=skip):
+            yield index, row
+
+
+def detect_format(path: Path) -> str:
+    return "csv" if path.suffix.lower() == ".csv" else "jsonl"
+
+
+class ImportCheckpoint:
+    """
+    导入进度文件：每提交一批记录后写入已处理的记录数，
+    中断后重新运行同一命令从该位置继续
+    """
+
+    def __init__(self, path: Path, source: Path):
+        self.path = Path(path)
+        self.source = str(Path(source).resolve())
+        self.stats = {"records": 0, "inserted": 0, "duplicates": 0, "invalid": 0}
+
+    def load(self) -> bool:
+        """读取与 source 对应的进度，返回是否存在可继续的进度"""
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return False
+        if data.get("source") != self.source:
+            print(f"⚠️ 进度文件 {self.path} 属于另一个文件，从头开始导入")
+            return False
+        self.stats.update({key: int(data.get(key, 0)) for key in self.stats})
+        return True
+
+    def save(self):
+        # 先写临时文件再改名，中断时不会留下写了一半的进度
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps({"source": self.source, **self.stats}), encoding="utf-8")
+        tmp.replace(self.path)
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
+
+
+def _print_progress(stats: Dict[str, int], rate: float):
+    print(
+        f"⏳ 已处理 {stats['records']} 条，导入 {stats['inserted']} 条，"
+        f"重复 {stats['duplicates']} 条，无效 {stats['invalid']} 条，{rate:.0f} 条/秒"
+    )
+
+
+async def import_file(
+    db: ChatDatabase,
+    source: Path,
+    fmt: Optional[str] = None,
+    batch_size: int = 100000,
+    checkpoint: Optional[Path] = None,
+    resume: bool = True,
+    progress: Callable[[Dict[str, int], float], None] = _print_progress,
+    progress_interval: float = 5.0
+) -> Dict[str, int]:
+    """
+    流式导入 JSONL 或 CSV 导出的历史发言记录，返回处理、导入、重复与无效记录数。
+
+    文件按行读取，每 batch_size 条在一个事务中写入，内存占用与文件大小无关；
+    按 msg_id 去重，已存在的消息不会重复计数。进度写入 checkpoint
+    （默认为 source 旁的 .import.json），中断后以相同参数再次调用即从断点继续。
+    导入期间汇总表不更新，全部写入后统一重建
+    """
+    source = Path(source)
+    fmt = fmt or detect_format(source)
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"不支持的导入格式: {fmt}")
+    state = ImportCheckpoint(checkpoint or source.with_name(source.name + ".import.json"), source)
+    if resume and state.load():
+        print(f"✅ 从第 {state.stats['records']} 条记录继续导入")
+    stats = state.stats
+
+    reader = read_csv if fmt == "csv" else read_jsonl
+    items = reader(source, skip=stats["records"])
+    started = last_report = time.monotonic()
+    resumed_from = stats["records"]
+    # 解析下一批的同时，上一批在数据库线程中写入
+    pending: Optional[Tuple[asyncio.Future, int, int]] = None
+    while True:
+        batch: List[Record] = []
+        records = 0
+        for index, item in islice(items, batch_size):
+            records += 1
+            try:
+                batch.append(to_record(item, index))
+            except (KeyError, StopIteration, TypeError, ValueError):
+                pass
+        # 按时间排序：同一分区的记录连续写入，同一用户以最晚的昵称为准
+        batch.sort(key=itemgetter(3))
+
+        if pending is not None:
+            future, done_records, valid = pending
+            inserted = await future
+            stats["records"] += done_records
+            stats["inserted"] += inserted
+            stats["duplicates"] += valid - inserted
+            stats["invalid"] += done_records - valid
+            # 只在批次提交后记录进度，中断时最多重新处理一批
+            state.save()
+        if not records:
+            break
+        pending = (asyncio.ensure_future(db.import_batch(batch)), records, len(batch))
+
+        now = time.monotonic()
+        if now - last_report >= progress_interval:
+            progress(stats, (stats["records"] - resumed_from) / (now - started))
+            last_report = now
+
+    print("⏳ 正在重建汇总表...")
+    await db.finish_import()
+    state.remove()
+    elapsed = time.monotonic() - started
+    progress(stats, (stats["records"] - resumed_from) / elapsed if elapsed > 0 else 0.0)
+    return dict(stats)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import heapq
+from collections import OrderedDict
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+
+class _GroupBoard:
+    __slots__ = ("day", "counts", "names")
+
+    def __init__(self, day: int):
+        self.day = day
+        self.counts: Dict[str, int] = {}
+        self.names: Dict[str, str] = {}
+
+
+class LiveLeaderboard:
+    """
+    今日发言计数的内存副本，按群维护。
+
+    只有从数据库完整加载过的群才会出现在这里，之后由写入流程增量更新；
+    跨天后旧数据自动失效，超过 max_groups 时淘汰最久未使用的群，
+    被淘汰的群在下次查询时重新从数据库加载。
+    当天发言人数超过 max_members 的群不保存在内存中，只记录为大群，
+    其榜单改由数据库中按计数排序的索引查询；max_members 为 0 时不限制。
+    """
+
+    def __init__(self, max_groups: int = 512, max_members: int = 0):
+        self.max_groups = max(1, max_groups)
+        self.max_members = max(0, max_members)
+        self._groups: OrderedDict[str, _GroupBoard] = OrderedDict()
+        # 大群及其日期
+        self._large: OrderedDict[str, int] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def _get(self, group_id: str, day: int) -> Optional[_GroupBoard]:
+        board = self._groups.get(group_id)
+        if board is None:
+            return None
+        if board.day != day:
+            del self._groups[group_id]
+            return None
+        self._groups.move_to_end(group_id)
+        return board
+
+    def is_large(self, group_id: str, day: int) -> bool:
+        return self._large.get(group_id) == day
+
+    def mark_large(self, group_id: str, day: int):
+        """将该群当天记为大群并释放其内存榜单"""
+        self._groups.pop(group_id, None)
+        self._large[group_id] = day
+        self._large.move_to_end(group_id)
+        while len(self._large) > self.max_groups:
+            self._large.popitem(last=False)
+
+    def load(self, group_id: str, day: int, rows: Iterable[Tuple[str, str, int]]):
+        """用数据库中该群当天的 (user_id, user_name, msg_count) 覆盖内存数据"""
+        board = _GroupBoard(day)
+        for user_id, user_name, msg_count in rows:
+            board.counts[user_id] = msg_count
+            board.names[user_id] = user_name
+        if self.max_members and len(board.counts) > self.max_members:
+            self.mark_large(group_id, day)
+            return
+        self._groups[group_id] = board
+        self._groups.move_to_end(group_id)
+        while len(self._groups) > self.max_groups:
+            self._groups.popitem(last=False)
+
+    def add(self, group_id: str, user_id: str, user_name: str, day: int):
+        """记录一条已写入数据库的消息，未加载的群直接忽略"""
+        board = self._groups.get(group_id)
+        if board is None or board.day != day:
+            return
+        count = board.counts.get(user_id)
+        if count is None and self.max_members and len(board.counts) >= self.max_members:
+            self.mark_large(group_id, day)
+            return
+        board.counts[user_id] = (count or 0) + 1
+        board.names[user_id] = user_name
+
+    def discard(self, group_id: str):
+        self._groups.pop(group_id, None)
+
+    def clear(self):
+        self._groups.clear()
+        self._large.clear()
+
+    def top(self, group_id: str, day: int, limit: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """返回该群当天的前 limit 名；群未加载或已跨天时返回 None"""
+        board = self._get(group_id, day)
+        if board is None:
+            return None
+        items = heapq.nsmallest(limit, board.counts.items(), key=lambda kv: (-kv[1], kv[0]))
+        return [
+            {"user_id": user_id, "user_name": board.names.get(user_id, user_id), "msg_count": count}
+            for user_id, count in items
+        ]
+
+    def rank(self, group_id: str, day: int, user_id: str) -> Optional[Tuple[int, int, int, int]]:
+        """返回 (发言数, 计数更高的人数, 计数更低的人数, 总人数)；群未加载或已跨天时返回 None"""
+        board = self._get(group_id, day)
+        if board is None:
+            return None
+        mine = board.counts.get(user_id, 0)
+        above = below = 0
+        for count in board.counts.values():
+            if count > mine:
+                above += 1
+            elif count < mine:
+                below += 1
+        return mine, above, below, len(board.counts)
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+
+# 汇总层级：(表名, 周期键列名)
+LEVELS = {
+    'day': ('daily_counts', 'day'),
+    'week': ('weekly_counts', 'week'),
+    'month': ('monthly_counts', 'month'),
+}
+
+# 自然周从周一开始，本周、本月榜单从周期第一天统计到今天
+PERIODS = ('week', 'month', 'total')
+
+Span = Tuple[str, int, int]
+
+
+def day_key(day: date) -> int:
+    """与 daily_counts.day 一致的日期键 YYYYMMDD"""
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def period_start(period: str, today: date) -> Optional[date]:
+    """本周 / 本月的第一天，total 没有起始日期"""
+    if period == 'week':
+        return week_start(today)
+    if period == 'month':
+        return today.replace(day=1)
+    if period == 'total':
+        return None
+    raise ValueError(f"未知的统计周期: {period}")
+
+
+def _next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def _split_weeks(start: date, end: date, open_end: bool) -> List[Span]:
+    monday = start + timedelta(days=-start.weekday() % 7)
+    week = monday
+    while week <= end and (week + timedelta(days=6) <= end or open_end):
+        week += timedelta(days=7)
+    if week == monday:
+        return [('day', day_key(start), day_key(end))]
+    spans = []
+    if start < monday:
+        spans.append(('day', day_key(start), day_key(monday - timedelta(days=1))))
+    spans.append(('week', day_key(monday), day_key(week - timedelta(days=7))))
+    if week <= end:
+        spans.append(('day', day_key(week), day_key(end)))
+    return spans
+
+
+def split_range(start: date, end: date, today: Optional[date] = None) -> List[Span]:
+    """
+    将日期区间 [start, end] 拆分为 (层级, 起始键, 结束键) 的列表：
+    中间的整月取 monthly_counts，两端剩余部分中的整周取 weekly_counts，其余取 daily_counts。
+    end 不早于 today 时今天之后不会有数据，包含今天的本周、本月也视为完整周期
+    """
+    if start > end:
+        return []
+    open_end = today is not None and end >= today
+
+    first = start if start.day == 1 else _next_month(start)
+    month = first
+    while month <= end and (_next_month(month) - timedelta(days=1) <= end or open_end):
+        month = _next_month(month)
+    if month == first:
+        return _split_weeks(start, end, open_end)
+
+    last = month - timedelta(days=1)
+    spans = [('month', first.year * 100 + first.month, last.year * 100 + last.month)]
+    if start < first:
+        spans = _split_weeks(start, first - timedelta(days=1), False) + spans
+    if month <= end:
+        spans += _split_weeks(month, end, open_end)
+    return spans
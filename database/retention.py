@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Optional
+
+from .db import ChatDatabase
+
+
+class RetentionScheduler:
+    """
+    在插件进程内定期清理过期发言记录。
+
+    启动后先等待 initial_delay 秒，避开插件启动时的写入高峰，
+    之后每 interval 秒执行一次分块删除与增量空间回收。
+    """
+
+    def __init__(
+        self,
+        db: ChatDatabase,
+        retention_days: int,
+        interval: float = 6 * 3600,
+        initial_delay: float = 60
+    ):
+        self.db = db
+        self.retention_days = retention_days
+        self.interval = interval
+        self.initial_delay = initial_delay
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.retention_days <= 0 or self.running:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def run_once(self) -> int:
+        deleted = await self.db.delete_old_records(self.retention_days)
+        if deleted:
+            print(f"✅ 已清理 {deleted} 条 {self.retention_days} 天前的发言记录")
+        return deleted
+
+    async def _loop(self):
+        await asyncio.sleep(self.initial_delay)
+        while True:
+            try:
+                await self.run_once()
+            except RuntimeError:
+                # 数据库已关闭
+                return
+            except Exception as e:
+                print(f"❌ 清理过期发言记录失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
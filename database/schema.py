@@ -0,0 +1,577 @@
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime
+from typing import Iterable, List, Tuple
+
+import aiosqlite
+
+
+# 数据库结构版本，记录在 PRAGMA user_version 中
+SCHEMA_VERSION = 10
+
+
+def msg_hash(msg_id: str) -> int:
+    """消息 ID 的 64 位有符号整数摘要，作为去重键"""
+    digest = hashlib.blake2b(msg_id.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+async def _table_columns(db: aiosqlite.Connection, table: str) -> list:
+    cursor = await db.execute(f'PRAGMA table_info({table})')
+    return [row[1] for row in await cursor.fetchall()]
+
+
+async def _create_v0(db: aiosqlite.Connection):
+    # 最初版本的表结构，旧数据库从这里开始逐步迁移
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS chat_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            user_name TEXT NOT NULL,
+            msg_time TEXT NOT NULL,
+            msg_id TEXT UNIQUE NOT NULL
+        )
+    ''')
+
+
+async def _migrate_v1(db: aiosqlite.Connection):
+    """
+    msg_time 文本改为整数时间戳 ts（秒），
+    并以 (group_id, ts, user_id) 覆盖索引替代 idx_group_time，
+    使时间范围查询可以直接走索引
+    """
+    if 'msg_time' in await _table_columns(db, 'chat_records'):
+        await db.execute('''
+            CREATE TABLE chat_records_v1 (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                group_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                user_name TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                msg_id TEXT UNIQUE NOT NULL
+            )
+        ''')
+        # 旧数据中 msg_time 为本地时间，'utc' 修饰符将其换算为 UTC 时间戳
+        await db.execute('''
+            INSERT INTO chat_records_v1 (id, group_id, user_id, user_name, ts, msg_id)
+            SELECT id, group_id, user_id, user_name,
+                   CAST(strftime('%s', msg_time, 'utc') AS INTEGER), msg_id
+            FROM chat_records
+            ORDER BY id
+        ''')
+        await db.execute('DROP TABLE chat_records')
+        await db.execute('ALTER TABLE chat_records_v1 RENAME TO chat_records')
+
+    await db.execute('''
+        CREATE INDEX IF NOT EXISTS idx_group_ts ON chat_records(group_id, ts, user_id)
+    ''')
+
+
+# 时间戳换算为本地日期键 YYYYMMDD（整数）
+DAY_KEY_SQL = "CAST(strftime('%Y%m%d', {ts}, 'unixepoch', 'localtime') AS INTEGER)"
+# 所在自然周周一的日期键 YYYYMMDD：先前进到周日（当天是周日则不变），再退回 6 天
+WEEK_KEY_SQL = "CAST(strftime('%Y%m%d', {ts}, 'unixepoch', 'localtime', 'weekday 0', '-6 days') AS INTEGER)"
+# 所在月份 YYYYMM
+MONTH_KEY_SQL = "CAST(strftime('%Y%m', {ts}, 'unixepoch', 'localtime') AS INTEGER)"
+
+
+async def _rebuild_rollups_v2(db: aiosqlite.Connection):
+    """v2 表结构下根据原始记录重建 daily_counts 与 members"""
+    await db.execute('DELETE FROM daily_counts')
+    await db.execute(f'''
+        INSERT INTO daily_counts (group_id, day, user_id, msg_count)
+        SELECT group_id, {DAY_KEY_SQL.format(ts='ts')}, user_id, COUNT(*)
+        FROM chat_records
+        GROUP BY 1, 2, 3
+    ''')
+    await db.execute('DELETE FROM members')
+    await db.execute('''
+        INSERT INTO members (group_id, user_id, user_name)
+        SELECT group_id, user_id, user_name
+        FROM chat_records
+        WHERE id IN (SELECT MAX(id) FROM chat_records GROUP BY group_id, user_id)
+    ''')
+
+
+async def _migrate_v2(db: aiosqlite.Connection):
+    """
+    新增按 (group_id, day, user_id) 预聚合的 daily_counts 计数表和 members 昵称表，
+    由 chat_records 的插入触发器在同一事务中维护，排行榜查询只需汇总小表
+    """
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS daily_counts (
+            group_id TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            user_id TEXT NOT NULL,
+            msg_count INTEGER NOT NULL,
+            PRIMARY KEY (group_id, day, user_id)
+        ) WITHOUT ROWID
+    ''')
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS members (
+            group_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            user_name TEXT NOT NULL,
+            PRIMARY KEY (group_id, user_id)
+        ) WITHOUT ROWID
+    ''')
+    await _create_rollup_trigger_v2(db)
+    await _rebuild_rollups_v2(db)
+
+
+async def _create_rollup_trigger_v2(db: aiosqlite.Connection):
+    # 触发器只对真正插入的行生效，INSERT OR IGNORE 忽略的重复消息不会被计数
+    await db.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_chat_records_rollup
+        AFTER INSERT ON chat_records
+        BEGIN
+            INSERT INTO daily_counts (group_id, day, user_id, msg_count)
+            VALUES (NEW.group_id, {DAY_KEY_SQL.format(ts='NEW.ts')}, NEW.user_id, 1)
+            ON CONFLICT (group_id, day, user_id) DO UPDATE SET msg_count = msg_count + 1;
+
+            INSERT INTO members (group_id, user_id, user_name)
+            VALUES (NEW.group_id, NEW.user_id, NEW.user_name)
+            ON CONFLICT (group_id, user_id) DO UPDATE SET user_name = excluded.user_name
+            WHERE user_name != excluded.user_name;
+        END
+    ''')
+
+
+async def _migrate_v3(db: aiosqlite.Connection):
+    """
+    msg_id 文本唯一键改为 64 位整数摘要 msg_hash，去掉多余的 idx_msg_id 索引，
+    每次插入只需维护一个定长整数的唯一索引
+    """
+    await db.execute('DROP INDEX IF EXISTS idx_msg_id')
+    if 'msg_id' not in await _table_columns(db, 'chat_records'):
+        return
+    await db.create_function('msg_hash', 1, msg_hash, deterministic=True)
+    await db.execute('''
+        CREATE TABLE chat_records_v3 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            user_name TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            msg_hash INTEGER UNIQUE NOT NULL
+        )
+    ''')
+    # 新表尚无触发器，复制时不会重复计数
+    await db.execute('''
+        INSERT OR IGNORE INTO chat_records_v3 (id, group_id, user_id, user_name, ts, msg_hash)
+        SELECT id, group_id, user_id, user_name, ts, msg_hash(msg_id)
+        FROM chat_records
+        ORDER BY id
+    ''')
+    await db.execute('DROP TABLE chat_records')
+    await db.execute('ALTER TABLE chat_records_v3 RENAME TO chat_records')
+    await db.execute('''
+        CREATE INDEX IF NOT EXISTS idx_group_ts ON chat_records(group_id, ts, user_id)
+    ''')
+    await _create_rollup_trigger_v2(db)
+
+
+async def _migrate_v4(db: aiosqlite.Connection):
+    """
+    规范化为整数键：groups / users 维度表保存文本 ID 与昵称（每人只存一份），
+    chat_records 只保留 (group_key, user_key, ts, msg_hash)，
+    daily_counts 也改用整数键，members 表由 users 取代
+    """
+    await db.execute('''
+        CREATE TABLE groups (
+            group_key INTEGER PRIMARY KEY,
+            group_id TEXT UNIQUE NOT NULL
+        )
+    ''')
+    await db.execute('''
+        CREATE TABLE users (
+            user_key INTEGER PRIMARY KEY,
+            user_id TEXT UNIQUE NOT NULL,
+            user_name TEXT NOT NULL
+        )
+    ''')
+    await db.execute('''
+        INSERT INTO groups (group_id)
+        SELECT DISTINCT group_id FROM chat_records ORDER BY group_id
+    ''')
+    # 每个用户取最近一条记录的昵称
+    await db.execute('''
+        INSERT INTO users (user_id, user_name)
+        SELECT user_id, user_name
+        FROM chat_records
+        WHERE id IN (SELECT MAX(id) FROM chat_records GROUP BY user_id)
+        ORDER BY user_id
+    ''')
+
+    await db.execute('''
+        CREATE TABLE chat_records_v4 (
+            id INTEGER PRIMARY KEY,
+            group_key INTEGER NOT NULL,
+            user_key INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            msg_hash INTEGER UNIQUE NOT NULL
+        )
+    ''')
+    await db.execute('''
+        INSERT INTO chat_records_v4 (id, group_key, user_key, ts, msg_hash)
+        SELECT r.id, g.group_key, u.user_key, r.ts, r.msg_hash
+        FROM chat_records r
+        JOIN groups g ON g.group_id = r.group_id
+        JOIN users u ON u.user_id = r.user_id
+        ORDER BY r.id
+    ''')
+    await db.execute('DROP TABLE chat_records')
+    await db.execute('ALTER TABLE chat_records_v4 RENAME TO chat_records')
+    await db.execute('''
+        CREATE INDEX idx_group_ts ON chat_records(group_key, ts, user_key)
+    ''')
+
+    await db.execute('DROP TABLE daily_counts')
+    await db.execute('DROP TABLE members')
+    await db.execute('''
+        CREATE TABLE daily_counts (
+            group_key INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            user_key INTEGER NOT NULL,
+            msg_count INTEGER NOT NULL,
+            PRIMARY KEY (group_key, day, user_key)
+        ) WITHOUT ROWID
+    ''')
+    # 昵称由写入流程直接更新 users，触发器只维护计数
+    await db.execute(f'''
+        CREATE TRIGGER trg_chat_records_rollup
+        AFTER INSERT ON chat_records
+        BEGIN
+            INSERT INTO daily_counts (group_key, day, user_key, msg_count)
+            VALUES (NEW.group_key, {DAY_KEY_SQL.format(ts='NEW.ts')}, NEW.user_key, 1)
+            ON CONFLICT (group_key, day, user_key) DO UPDATE SET msg_count = msg_count + 1;
+        END
+    ''')
+    await _rebuild_rollups_v4(db)
+
+
+async def _rebuild_rollups_v4(db: aiosqlite.Connection):
+    """v4 表结构下根据原始记录重建 daily_counts"""
+    await db.execute('DELETE FROM daily_counts')
+    await db.execute(f'''
+        INSERT INTO daily_counts (group_key, day, user_key, msg_count)
+        SELECT group_key, {DAY_KEY_SQL.format(ts='ts')}, user_key, COUNT(*)
+        FROM chat_records
+        GROUP BY 1, 2, 3
+    ''')
+
+
+async def rebuild_rollups(db: aiosqlite.Connection):
+    """根据 chat_records 原始记录重建 daily_counts 及其上层的各级汇总，需在事务中调用"""
+    await _rebuild_rollups_v4(db)
+    await rebuild_user_totals(db)
+    await rebuild_period_counts(db)
+
+
+# chat_records 按本地时间的自然月分区，每月一张表，chat_records 本身是合并各分区的视图
+PARTITION_PREFIX = 'chat_records_p'
+
+
+def month_key(ts: int) -> int:
+    """时间戳所在的月份 YYYYMM"""
+    t = datetime.fromtimestamp(ts)
+    return t.year * 100 + t.month
+
+
+def month_bounds(month: int) -> Tuple[int, int]:
+    """月份 YYYYMM 的起止时间戳 [start, end)"""
+    year, mon = divmod(month, 100)
+    start = datetime(year, mon, 1)
+    end = datetime(year + mon // 12, mon % 12 + 1, 1)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def partition_name(month: int) -> str:
+    return f'{PARTITION_PREFIX}{month}'
+
+
+PARTITION_LIST_SQL = f"""
+    SELECT CAST(substr(name, {len(PARTITION_PREFIX) + 1}) AS INTEGER)
+    FROM sqlite_master
+    WHERE type = 'table' AND name GLOB '{PARTITION_PREFIX}[0-9][0-9][0-9][0-9][0-9][0-9]'
+    ORDER BY name
+"""
+
+
+def partition_table_sql(month: int) -> str:
+    # 榜单都从汇总表查询，分区只保留去重用的 msg_hash 唯一索引
+    return f'''
+        CREATE TABLE IF NOT EXISTS {partition_name(month)} (
+            id INTEGER PRIMARY KEY,
+            group_key INTEGER NOT NULL,
+            user_key INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            msg_hash INTEGER UNIQUE NOT NULL
+        )
+    '''
+
+
+# 分区插入触发器中维护汇总表的语句：日 → 周 → 月 → 累计逐级计数
+_ROLLUP_SQL = f'''
+            INSERT INTO daily_counts (group_key, day, user_key, msg_count)
+            VALUES (NEW.group_key, {DAY_KEY_SQL.format(ts='NEW.ts')}, NEW.user_key, 1)
+            ON CONFLICT (group_key, day, user_key) DO UPDATE SET msg_count = msg_count + 1;
+
+            INSERT INTO weekly_counts (group_key, week, user_key, msg_count)
+            VALUES (NEW.group_key, {WEEK_KEY_SQL.format(ts='NEW.ts')}, NEW.user_key, 1)
+            ON CONFLICT (group_key, week, user_key) DO UPDATE SET msg_count = msg_count + 1;
+
+            INSERT INTO monthly_counts (group_key, month, user_key, msg_count)
+            VALUES (NEW.group_key, {MONTH_KEY_SQL.format(ts='NEW.ts')}, NEW.user_key, 1)
+            ON CONFLICT (group_key, month, user_key) DO UPDATE SET msg_count = msg_count + 1;
+
+            INSERT INTO user_totals (group_key, user_key, msg_count)
+            VALUES (NEW.group_key, NEW.user_key, 1)
+            ON CONFLICT (group_key, user_key) DO UPDATE SET msg_count = msg_count + 1;
+'''
+
+
+def partition_trigger_sql(month: int, rollup_sql: str = _ROLLUP_SQL) -> str:
+    # 每个分区各自的插入触发器维护汇总表，只对真正插入的行生效
+    name = partition_name(month)
+    return f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{name}_rollup
+        AFTER INSERT ON {name}
+        BEGIN
+{rollup_sql}
+        END
+    '''
+
+
+def view_sql(months: Iterable[int]) -> List[str]:
+    """重建合并所有分区的 chat_records 视图，供去重查询与汇总重建使用"""
+    selects = [
+        f'SELECT id, group_key, user_key, ts, msg_hash FROM {partition_name(m)}'
+        for m in months
+    ]
+    if not selects:
+        selects = ['SELECT 0 AS id, 0 AS group_key, 0 AS user_key, 0 AS ts, 0 AS msg_hash WHERE 0']
+    return [
+        'DROP VIEW IF EXISTS chat_records',
+        'CREATE VIEW chat_records AS ' + ' UNION ALL '.join(selects),
+    ]
+
+
+_ROLLUP_SQL_V5 = f'''
+            INSERT INTO daily_counts (group_key, day, user_key, msg_count)
+            VALUES (NEW.group_key, {DAY_KEY_SQL.format(ts='NEW.ts')}, NEW.user_key, 1)
+            ON CONFLICT (group_key, day, user_key) DO UPDATE SET msg_count = msg_count + 1;
+'''
+
+
+async def _migrate_v5(db: aiosqlite.Connection):
+    """
+    chat_records 拆分为按月的分区表，原表名改为合并各分区的视图。
+    插入只维护当月分区的小索引，过期数据可以整表删除
+    """
+    cursor = await db.execute('''
+        SELECT DISTINCT CAST(strftime('%Y%m', ts, 'unixepoch', 'localtime') AS INTEGER)
+        FROM chat_records
+    ''')
+    months = sorted(row[0] for row in await cursor.fetchall())
+    for month in months:
+        await db.execute(partition_table_sql(month))
+        start, end = month_bounds(month)
+        await db.execute(f'''
+            INSERT INTO {partition_name(month)} (id, group_key, user_key, ts, msg_hash)
+            SELECT id, group_key, user_key, ts, msg_hash
+            FROM chat_records
+            WHERE ts >= ? AND ts < ?
+            ORDER BY id
+        ''', (start, end))
+        # 数据复制完成后再创建触发器，避免重复计数
+        await db.execute(partition_trigger_sql(month, _ROLLUP_SQL_V5))
+    await db.execute('DROP TABLE chat_records')
+    for sql in view_sql(months):
+        await db.execute(sql)
+
+
+_ROLLUP_SQL_V6 = f'''
+            INSERT INTO daily_counts (group_key, day, user_key, msg_count)
+            VALUES (NEW.group_key, {DAY_KEY_SQL.format(ts='NEW.ts')}, NEW.user_key, 1)
+            ON CONFLICT (group_key, day, user_key) DO UPDATE SET msg_count = msg_count + 1;
+
+            INSERT INTO user_totals (group_key, user_key, msg_count)
+            VALUES (NEW.group_key, NEW.user_key, 1)
+            ON CONFLICT (group_key, user_key) DO UPDATE SET msg_count = msg_count + 1;
+'''
+
+
+async def _migrate_v6(db: aiosqlite.Connection):
+    """
+    新增每人累计计数 user_totals，并为 user_totals 与 daily_counts 建立按计数排序的索引，
+    个人排名只需统计索引中计数更高的条目，无需汇总历史记录
+    """
+    await db.execute('''
+        CREATE TABLE user_totals (
+            group_key INTEGER NOT NULL,
+            user_key INTEGER NOT NULL,
+            msg_count INTEGER NOT NULL,
+            PRIMARY KEY (group_key, user_key)
+        ) WITHOUT ROWID
+    ''')
+    await db.execute('''
+        CREATE INDEX idx_user_totals_rank ON user_totals(group_key, msg_count)
+    ''')
+    await db.execute('''
+        CREATE INDEX idx_daily_counts_rank ON daily_counts(group_key, day, msg_count)
+    ''')
+    await rebuild_user_totals(db)
+
+    cursor = await db.execute(PARTITION_LIST_SQL)
+    for (month,) in await cursor.fetchall():
+        await db.execute(f'DROP TRIGGER IF EXISTS trg_{partition_name(month)}_rollup')
+        await db.execute(partition_trigger_sql(month, _ROLLUP_SQL_V6))
+
+
+async def rebuild_user_totals(db: aiosqlite.Connection, group_key=None):
+    """根据 daily_counts 重建 user_totals（可只重建一个群），需在事务中调用"""
+    where = '' if group_key is None else 'WHERE group_key = ?'
+    params = () if group_key is None else (group_key,)
+    await db.execute(f'DELETE FROM user_totals {where}', params)
+    await db.execute(f'''
+        INSERT INTO user_totals (group_key, user_key, msg_count)
+        SELECT group_key, user_key, SUM(msg_count)
+        FROM daily_counts
+        {where}
+        GROUP BY group_key, user_key
+    ''', params)
+
+
+# daily_counts 的日期键换算为周、月键
+_DAY_DATE_SQL = "printf('%04d-%02d-%02d', day / 10000, day / 100 % 100, day % 100)"
+_WEEK_OF_DAY_SQL = f"CAST(strftime('%Y%m%d', {_DAY_DATE_SQL}, 'weekday 0', '-6 days') AS INTEGER)"
+
+
+async def rebuild_period_counts(db: aiosqlite.Connection, group_key=None):
+    """根据 daily_counts 重建 weekly_counts 与 monthly_counts（可只重建一个群），需在事务中调用"""
+    where = '' if group_key is None else 'WHERE group_key = ?'
+    params = () if group_key is None else (group_key,)
+    for table, column, key_sql in (
+        ('weekly_counts', 'week', _WEEK_OF_DAY_SQL),
+        ('monthly_counts', 'month', 'day / 100'),
+    ):
+        await db.execute(f'DELETE FROM {table} {where}', params)
+        await db.execute(f'''
+            INSERT INTO {table} (group_key, {column}, user_key, msg_count)
+            SELECT group_key, {key_sql}, user_key, SUM(msg_count)
+            FROM daily_counts
+            {where}
+            GROUP BY 1, 2, 3
+        ''', params)
+
+
+async def _migrate_v7(db: aiosqlite.Connection):
+    """
+    新增按自然周、自然月预聚合的 weekly_counts 与 monthly_counts，
+    与 daily_counts、user_totals 一起由分区触发器逐级维护。
+    长时间段的榜单拆成整月、整周与零散日期分别汇总，行数不再随天数线性增长
+    """
+    await db.execute('''
+        CREATE TABLE weekly_counts (
+            group_key INTEGER NOT NULL,
+            week INTEGER NOT NULL,
+            user_key INTEGER NOT NULL,
+            msg_count INTEGER NOT NULL,
+            PRIMARY KEY (group_key, week, user_key)
+        ) WITHOUT ROWID
+    ''')
+    await db.execute('''
+        CREATE TABLE monthly_counts (
+            group_key INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            user_key INTEGER NOT NULL,
+            msg_count INTEGER NOT NULL,
+            PRIMARY KEY (group_key, month, user_key)
+        ) WITHOUT ROWID
+    ''')
+    await rebuild_period_counts(db)
+
+    cursor = await db.execute(PARTITION_LIST_SQL)
+    for (month,) in await cursor.fetchall():
+        await db.execute(f'DROP TRIGGER IF EXISTS trg_{partition_name(month)}_rollup')
+        await db.execute(partition_trigger_sql(month))
+
+
+async def _migrate_v8(db: aiosqlite.Connection):
+    """新增 topk_sketches，保存超大群今日榜单的近似计数器，重启后无需重新加载"""
+    await db.execute('''
+        CREATE TABLE topk_sketches (
+            group_key INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            sketch TEXT NOT NULL,
+            PRIMARY KEY (group_key, day)
+        ) WITHOUT ROWID
+    ''')
+
+
+async def _migrate_v9(db: aiosqlite.Connection):
+    """
+    删除各分区的 (group_key, ts, user_key) 索引：榜单与个人排名都改由汇总表查询后
+    不再有查询使用它，每次插入却仍需维护
+    """
+    cursor = await db.execute(PARTITION_LIST_SQL)
+    for (month,) in await cursor.fetchall():
+        await db.execute(f'DROP INDEX IF EXISTS idx_{partition_name(month)}_group_ts')
+
+
+async def _migrate_v10(db: aiosqlite.Connection):
+    """删除 topk_sketches：超大群的今日榜单改由 daily_counts 的计数索引精确查询"""
+    await db.execute('DROP TABLE IF EXISTS topk_sketches')
+
+
+_MIGRATIONS = [
+    _migrate_v1,
+    _migrate_v2,
+    _migrate_v3,
+    _migrate_v4,
+    _migrate_v5,
+    _migrate_v6,
+    _migrate_v7,
+    _migrate_v8,
+    _migrate_v9,
+    _migrate_v10,
+]
+
+
+async def _enable_incremental_vacuum(db: aiosqlite.Connection):
+    """
+    开启 auto_vacuum=INCREMENTAL，删除数据后可用 PRAGMA incremental_vacuum 分批回收空间。
+    已有数据的库需要一次 VACUUM 才能切换，不能在事务中执行
+    """
+    cursor = await db.execute('PRAGMA auto_vacuum')
+    if (await cursor.fetchone())[0] == 2:
+        return
+    await db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    await db.execute('VACUUM')
+    print("✅ 数据库已启用增量回收空间（auto_vacuum=INCREMENTAL）")
+
+
+async def migrate(db: aiosqlite.Connection):
+    """将数据库结构升级到 SCHEMA_VERSION，每一步在单个事务中完成"""
+    cursor = await db.execute('PRAGMA user_version')
+    version = (await cursor.fetchone())[0]
+
+    if version == 0:
+        await _create_v0(db)
+        await db.commit()
+
+    for target, step in enumerate(_MIGRATIONS[version:], start=version + 1):
+        await db.execute('BEGIN IMMEDIATE')
+        try:
+            await step(db)
+            await db.execute(f'PRAGMA user_version = {target}')
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        print(f"✅ 数据库结构已升级到 v{target}")
+
+    await _enable_incremental_vacuum(db)
@@ -0,0 +1,676 @@
+import asyncio
+import sqlite3
+import subprocess
+import sys
+import textwrap
+from datetime import datetime, date, time, timedelta
+
+from pathlib import Path
+
+from database import ChatDatabase
+from database.schema import partition_name
+from database.leaderboard import LiveLeaderboard
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _today_key() -> int:
+    today = date.today()
+    return today.year * 10000 + today.month * 100 + today.day
+
+
+def _insert_many(db: ChatDatabase, count: int, group_id: str = "g1"):
+    async def run():
+        now = datetime.now()
+        for i in range(count):
+            await db.insert_record(group_id, f"u{i % 3}", f"用户{i % 3}", now, f"m{group_id}{i}")
+    return run()
+
+
+def test_write_behind_flush_on_close(tmp_path):
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"), batch_size=50, flush_interval=60)
+        await _insert_many(db, 120)
+        await db.close()
+        assert db.pending_count == 0
+
+        reader = ChatDatabase(str(tmp_path / "chat.db"))
+        ranking = await reader.get_range_ranking("g1", days=1)
+        assert [r["msg_count"] for r in ranking] == [40, 40, 40]
+        await reader.close()
+
+    asyncio.run(run())
+
+
+def test_write_behind_backpressure(tmp_path):
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"), batch_size=10, flush_interval=0.01, max_pending=10)
+        await _insert_many(db, 100)
+        assert db.pending_count <= 10
+        await db.flush()
+        assert await db.record_exists("mg199") is True
+        assert await db.record_exists("mg1100") is False
+        await db.close()
+
+    asyncio.run(run())
+
+
+def test_persistent_connections_use_wal(tmp_path):
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"), reader_count=2, synchronous="normal")
+        await _insert_many(db, 10)
+        await db.flush()
+        async with db._reader() as reader:
+            cursor = await reader.execute("PRAGMA journal_mode")
+            assert (await cursor.fetchone())[0] == "wal"
+        ranking = await db.get_range_ranking("g1", days=1)
+        assert sum(r["msg_count"] for r in ranking) == 10
+        await db.close()
+        assert db._writer is None
+
+    asyncio.run(run())
+
+
+def test_migrates_legacy_text_timestamps(tmp_path):
+    path = tmp_path / "legacy.db"
+    legacy = sqlite3.connect(path)
+    legacy.execute('''
+        CREATE TABLE chat_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            user_name TEXT NOT NULL,
+            msg_time TEXT NOT NULL,
+            msg_id TEXT UNIQUE NOT NULL
+        )
+    ''')
+    # 固定在中午，避免临近零点时 days=1 / days=7 的断言不稳定
+    now = datetime.combine(date.today(), time(12))
+    old = now - timedelta(days=3)
+    rows = [("g1", "u1", "甲", now, "a"), ("g1", "u1", "甲", now, "b"),
+            ("g1", "u2", "乙", now, "c"), ("g1", "u2", "乙", old, "d")]
+    legacy.executemany(
+        "INSERT INTO chat_records (group_id, user_id, user_name, msg_time, msg_id) VALUES (?, ?, ?, ?, ?)",
+        [(g, u, n, t.strftime('%Y-%m-%d %H:%M:%S'), m) for g, u, n, t, m in rows]
+    )
+    legacy.commit()
+    legacy.close()
+
+    async def run():
+        db = ChatDatabase(str(path))
+        today = await db.get_range_ranking("g1", days=1)
+        assert [(r["user_id"], r["msg_count"]) for r in today] == [("u1", 2), ("u2", 1)]
+        week = await db.get_range_ranking("g1", days=7)
+        assert [(r["user_id"], r["msg_count"]) for r in week] == [("u1", 2), ("u2", 2)]
+        async with db._reader() as reader:
+            cursor = await reader.execute("PRAGMA user_version")
+            assert (await cursor.fetchone())[0] >= 1
+        await db.close()
+
+    asyncio.run(run())
+
+
+def test_process_exits_without_close_and_keeps_pending_rows(tmp_path):
+    db_path = tmp_path / "chat.db"
+    script = textwrap.dedent(f'''
+        import asyncio, sys
+        from datetime import datetime
+        sys.path.insert(0, {str(ROOT)!r})
+        from database import ChatDatabase
+
+        async def main():
+            db = ChatDatabase({str(db_path)!r}, flush_interval=3600)
+            for i in range(25):
+                await db.insert_record("g1", "u1", "甲", datetime.now(), f"m{{i}}")
+
+        asyncio.run(main())
+    ''')
+    result = subprocess.run([sys.executable, "-c", script], timeout=30)
+    assert result.returncode == 0
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM chat_records").fetchone()[0] == 25
+    conn.close()
+
+
+class _FlakyWriter:
+    """第一次 executemany 抛出异常，之后透传给真实连接"""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.failures = 1
+
+    async def executemany(self, sql, params):
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError("disk I/O error")
+        return await self._conn.executemany(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def test_failed_batch_is_retried(tmp_path):
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"), flush_interval=3600)
+        await _insert_many(db, 30)
+        real_writer = db._writer
+        db._writer = _FlakyWriter(real_writer)
+        await db.flush()
+        assert db.pending_count == 30
+
+        await db.flush()
+        assert db.pending_count == 0
+        db._writer = real_writer
+        assert await db.record_exists("mg129")
+        await db.close()
+
+    asyncio.run(run())
+
+
+def test_closed_database_rejects_records(tmp_path):
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"))
+        await _insert_many(db, 5)
+        await db.close()
+        assert await db.insert_record("g1", "u1", "甲", datetime.now(), "late") is False
+        assert db._flush_task is None and db._writer is None
+
+    asyncio.run(run())
+
+
+def test_shutdown_flushes_pending_records(tmp_path):
+    db_path = tmp_path / "chat.db"
+
+    async def run():
+        db = ChatDatabase(str(db_path), flush_interval=3600)
+        await _insert_many(db, 12)
+        # 事件循环仍在运行时 shutdown 会安排异步关闭
+        db.shutdown()
+        await asyncio.sleep(0.2)
+        assert db._writer is None
+        return db
+
+    asyncio.run(run())
+
+    async def insert_only():
+        db = ChatDatabase(str(db_path), flush_interval=3600)
+        await _insert_many(db, 7, group_id="g2")
+        return db
+
+    # asyncio.run 退出时会取消后台写入任务，由其写入剩余记录，之后 shutdown 为空操作
+    db = asyncio.run(insert_only())
+    assert db.pending_count == 0
+    db.shutdown()
+
+    conn = sqlite3.connect(db_path)
+    counts = dict(conn.execute('''
+        SELECT g.group_id, COUNT(*) FROM chat_records r
+        JOIN groups g ON g.group_key = r.group_key
+        GROUP BY g.group_id
+    '''))
+    conn.close()
+    assert counts == {"g1": 12, "g2": 7}
+
+
+def test_daily_counts_follow_inserts_and_rebuild(tmp_path):
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"))
+        noon = datetime.combine(date.today(), time(12))
+        await db.insert_record("g1", "u1", "甲", noon, "a")
+        await db.insert_record("g1", "u1", "新甲", noon, "b")
+        await db.insert_record("g1", "u1", "新甲", noon, "b")  # 重复消息不计数
+        await db.insert_record("g1", "u2", "乙", noon - timedelta(days=1), "c")
+        await db.flush()
+
+        expected = [("u1", "新甲", 2), ("u2", "乙", 1)]
+        ranking = await db.get_range_ranking("g1", days=2)
+        assert [(r["user_id"], r["user_name"], r["msg_count"]) for r in ranking] == expected
+        assert await db.get_user_stats("g1", "u2") == {"total_msgs": 1, "today_msgs": 0}
+
+        await db._writer.execute("DELETE FROM daily_counts")
+        await db._writer.commit()
+        await db.rebuild_rollups()
+        ranking = await db.get_range_ranking("g1", days=2)
+        assert [(r["user_id"], r["user_name"], r["msg_count"]) for r in ranking] == expected
+        await db.close()
+
+    asyncio.run(run())
+
+
+def test_live_leaderboard_serves_today(tmp_path):
+    path = str(tmp_path / "chat.db")
+
+    async def seed():
+        db = ChatDatabase(path)
+        await _insert_many(db, 6)
+        await db.close()
+
+    async def run():
+        db = ChatDatabase(path, live_groups=1)
+        await db._ensure_initialized()
+        # 启动时已从 daily_counts 加载
+        assert db._live.top("g1", _today_key(), 10) is not None
+
+        now = datetime.now()
+        await db.insert_record("g1", "u9", "新人", now, "x1")
+        await db.insert_record("g1", "u9", "新人", now, "x2")
+        await db.insert_record("g1", "u9", "新人", now, "x3")
+        await db.flush()
+        ranking = await db.get_range_ranking("g1", days=1)
+        assert ranking[0] == {"user_id": "u9", "user_name": "新人", "msg_count": 3}
+        assert sum(r["msg_count"] for r in ranking) == 9
+
+        # 窗口之外的重复消息使该群失效，下次查询从数据库重新加载
+        db._recent.clear()
+        await db.insert_record("g1", "u9", "新人", now, "x3")
+        await db.flush()
+        assert "g1" not in db._live._groups
+        assert (await db.get_range_ranking("g1", days=1))[0]["msg_count"] == 3
+
+        # 超过上限时淘汰最久未使用的群
+        await db.insert_record("g2", "u1", "甲", now, "y1")
+        await db.flush()
+        assert await db.get_range_ranking("g2", days=1) == [
+            {"user_id": "u1", "user_name": "甲", "msg_count": 1}
+        ]
+        assert list(db._live._groups) == ["g2"]
+        await db.close()
+
+    asyncio.run(seed())
+    asyncio.run(run())
+
+
+def test_live_leaderboard_rolls_over_and_ranks():
+    board = LiveLeaderboard(max_groups=2)
+    board.load("g1", 20260101, [("u1", "甲", 2), ("u2", "乙", 2), ("u3", "丙", 5)])
+    board.add("g1", "u2", "乙", 20260101)
+    board.add("g9", "u1", "甲", 20260101)  # 未加载的群被忽略
+    assert [r["user_id"] for r in board.top("g1", 20260101, 2)] == ["u3", "u2"]
+    assert board.top("g9", 20260101) is None
+    assert board.top("g1", 20260102) is None
+    assert len(board) == 0
+
+
+def test_retention_deletes_in_chunks_and_reclaims_space(tmp_path):
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"), batch_size=500)
+        old = datetime.combine(date.today() - timedelta(days=40), time(12))
+        for i in range(2000):
+            await db.insert_record("g1", f"u{i % 4}", "x" * 200, old, f"old{i}")
+        await _insert_many(db, 30)
+        await db.flush()
+
+        async with db._reader() as reader:
+            cursor = await reader.execute("PRAGMA auto_vacuum")
+            assert (await cursor.fetchone())[0] == 2
+
+        deleted = await db.delete_old_records(days=30, chunk_size=300, pause=0)
+        assert deleted == 2000
+
+        async with db._reader() as reader:
+            cursor = await reader.execute("SELECT COUNT(*) FROM chat_records")
+            assert (await cursor.fetchone())[0] == 30
+            cursor = await reader.execute("SELECT MIN(day) FROM daily_counts")
+            assert (await cursor.fetchone())[0] == _today_key()
+            cursor = await reader.execute("PRAGMA freelist_count")
+            assert (await cursor.fetchone())[0] == 0
+
+        ranking = await db.get_range_ranking("g1", days=60)
+        assert sum(r["msg_count"] for r in ranking) == 30
+        await db.close()
+
+    asyncio.run(run())
+
+
+def test_retention_scheduler_runs_periodically(tmp_path):
+    from database.retention import RetentionScheduler
+
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"))
+        old = datetime.combine(date.today() - timedelta(days=10), time(12))
+        await db.insert_record("g1", "u1", "用户1", old, "old")
+        await db.flush()
+
+        scheduler = RetentionScheduler(db, retention_days=7, interval=60, initial_delay=0)
+        scheduler.start()
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if not await db.record_exists("old"):
+                break
+        assert scheduler.running
+        assert not await db.record_exists("old")
+        await scheduler.stop()
+        assert not scheduler.running
+        await db.close()
+
+    asyncio.run(run())
+
+
+def test_recent_ids_drop_redelivered_messages_before_queue(tmp_path):
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"), batch_size=100, flush_interval=60, dedup_window=2)
+        now = datetime.now()
+        await db.insert_record("g1", "u1", "甲", now, "a")
+        await db.insert_record("g1", "u1", "甲", now, "a")
+        assert db.pending_count == 1
+        await db.insert_record("g1", "u1", "甲", now, "b")
+        await db.insert_record("g1", "u1", "甲", now, "c")
+        # "a" 已移出窗口，由数据库唯一索引去重
+        await db.insert_record("g1", "u1", "甲", now, "a")
+        assert db.pending_count == 4
+        await db.flush()
+
+        ranking = await db.get_range_ranking("g1", days=1)
+        assert ranking[0]["msg_count"] == 3
+        assert await db.record_exists("c") is True
+        assert await db.record_exists("d") is False
+        await db.close()
+
+    asyncio.run(run())
+
+
+def test_msg_id_column_migrates_to_integer_hash(tmp_path):
+    path = tmp_path / "v2.db"
+
+    async def run():
+        db = ChatDatabase(str(path))
+        await db._ensure_initialized()
+        async with db._reader() as reader:
+            cursor = await reader.execute("PRAGMA table_info(chat_records)")
+            columns = {row[1]: row[2] for row in await cursor.fetchall()}
+            today = date.today()
+            cursor = await reader.execute(f"PRAGMA index_list(chat_records_p{today.year * 100 + today.month})")
+            indexes = [row[1] for row in await cursor.fetchall()]
+        await db.close()
+        return columns, indexes
+
+    # 模拟 v2 数据库：文本 msg_id 与冗余索引
+    legacy = sqlite3.connect(path)
+    legacy.executescript('''
+        CREATE TABLE chat_records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            user_name TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            msg_id TEXT UNIQUE NOT NULL
+        );
+        CREATE INDEX idx_msg_id ON chat_records(msg_id);
+        PRAGMA user_version = 1;
+    ''')
+    ts = int(datetime.combine(date.today(), time(12)).timestamp())
+    legacy.executemany(
+        "INSERT INTO chat_records (group_id, user_id, user_name, ts, msg_id) VALUES (?, ?, ?, ?, ?)",
+        [("g1", "u1", "甲", ts, "x"), ("g1", "u2", "乙", ts, "y")]
+    )
+    legacy.commit()
+    legacy.close()
+
+    columns, indexes = asyncio.run(run())
+    assert columns["msg_hash"] == "INTEGER" and "msg_id" not in columns
+    assert not any("msg_id" in name for name in indexes)
+    # 分区只剩 msg_hash 的唯一索引
+    assert len(indexes) == 1
+
+    async def check():
+        db = ChatDatabase(str(path))
+        assert await db.record_exists("x") is True
+        await db.insert_record("g1", "u1", "甲", datetime.combine(date.today(), time(12)), "x")
+        await db.flush()
+        ranking = await db.get_range_ranking("g1", days=1)
+        assert [(r["user_id"], r["msg_count"]) for r in ranking] == [("u1", 1), ("u2", 1)]
+        await db.close()
+
+    asyncio.run(check())
+
+
+def test_partition_group_ts_index_is_dropped(tmp_path):
+    path = tmp_path / "v8.db"
+    month = date.today().year * 100 + date.today().month
+
+    async def create():
+        db = ChatDatabase(str(path))
+        await _insert_many(db, 3)
+        await db.close()
+
+    asyncio.run(create())
+    # 模拟 v8 数据库：分区上还有 (group_key, ts, user_key) 索引
+    conn = sqlite3.connect(path)
+    conn.executescript(f'''
+        CREATE INDEX idx_{partition_name(month)}_group_ts ON {partition_name(month)}(group_key, ts, user_key);
+        PRAGMA user_version = 8;
+    ''')
+    conn.close()
+
+    async def reopen():
+        db = ChatDatabase(str(path))
+        await db._ensure_initialized()
+        async with db._reader() as reader:
+            cursor = await reader.execute(f"PRAGMA index_list({partition_name(month)})")
+            indexes = [row[1] for row in await cursor.fetchall()]
+        await db.close()
+        return indexes
+
+    assert not any(name.endswith("_group_ts") for name in asyncio.run(reopen()))
+
+
+def test_normalized_schema_stores_names_once(tmp_path):
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"))
+        now = datetime.now()
+        await db.insert_record("g1", "u1", "甲", now, "a")
+        await db.insert_record("g2", "u1", "甲", now, "b")
+        await db.insert_record("g2", "u2", "乙", now, "c")
+        await db.insert_record("g2", "u1", "改名甲", now, "d")
+        await db.flush()
+
+        async with db._reader() as reader:
+            cursor = await reader.execute("PRAGMA table_info(chat_records)")
+            assert [row[1] for row in await cursor.fetchall()] == ["id", "group_key", "user_key", "ts", "msg_hash"]
+            cursor = await reader.execute("SELECT user_id, user_name FROM users ORDER BY user_id")
+            assert [tuple(row) for row in await cursor.fetchall()] == [("u1", "改名甲"), ("u2", "乙")]
+            cursor = await reader.execute("SELECT COUNT(*) FROM groups")
+            assert (await cursor.fetchone())[0] == 2
+
+        ranking = await db.get_range_ranking("g2", days=3)
+        assert [(r["user_id"], r["user_name"], r["msg_count"]) for r in ranking] == [("u1", "改名甲", 2), ("u2", "乙", 1)]
+        assert await db.get_user_stats("g1", "u1") == {"total_msgs": 1, "today_msgs": 1}
+        assert await db.get_user_stats("g1", "nobody") == {"total_msgs": 0, "today_msgs": 0}
+        await db.close()
+
+    asyncio.run(run())
+
+
+def test_monthly_partitions_are_dropped_whole(tmp_path):
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"))
+        today = date.today()
+        first = today.replace(day=1)
+        old = datetime.combine(first - timedelta(days=80), time(12))
+        for i in range(50):
+            await db.insert_record("g1", "u1", "甲", old, f"old{i}")
+        await _insert_many(db, 9)
+        await db.flush()
+
+        async with db._write_lock:
+            months = await db._partition_months()
+        assert months == [old.year * 100 + old.month, today.year * 100 + today.month]
+        ranking = await db.get_range_ranking("g1", days=120)
+        assert sum(r["msg_count"] for r in ranking) == 59
+        assert await db.record_exists("old3") is True
+
+        deleted = await db.delete_old_records(days=today.day + 1, pause=0)
+        assert deleted == 50
+        async with db._write_lock:
+            assert await db._partition_months() == [today.year * 100 + today.month]
+        assert await db.record_exists("old3") is False
+        assert sum(r["msg_count"] for r in await db.get_range_ranking("g1", days=120)) == 9
+        await db.close()
+
+    asyncio.run(run())
+
+
+def test_partition_created_during_retention_stays_in_view(tmp_path):
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"))
+        today = date.today()
+        old = datetime.combine(today.replace(day=1) - timedelta(days=80), time(12))
+        for i in range(5):
+            await db.insert_record("g1", "u1", "甲", old, f"old{i}")
+        await db.flush()
+
+        # 统计过期分区期间写入任务新建了下一个月的分区
+        upcoming = datetime.combine(today.replace(day=1) + timedelta(days=40), time(12))
+        drop_partitions = db._drop_partitions
+
+        async def racing_drop(expired):
+            await db.insert_record("g1", "u1", "甲", upcoming, "next")
+            await db.flush()
+            return await drop_partitions(expired)
+
+        db._drop_partitions = racing_drop
+        assert await db.delete_old_records(days=today.day + 1, pause=0) == 5
+        assert await db.record_exists("next") is True
+        await db.close()
+
+        # 重启时视图按现有分区重建
+        conn = sqlite3.connect(tmp_path / "chat.db")
+        conn.executescript(
+            'DROP VIEW chat_records;'
+            f'CREATE VIEW chat_records AS SELECT * FROM {partition_name(today.year * 100 + today.month)}'
+        )
+        conn.close()
+        reopened = ChatDatabase(str(tmp_path / "chat.db"))
+        assert await reopened.record_exists("next") is True
+        await reopened.close()
+
+    asyncio.run(run())
+
+
+def test_user_rank_uses_rollups(tmp_path):
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"))
+        noon = datetime.combine(date.today(), time(12))
+        counts = {"u1": 5, "u2": 3, "u3": 1}
+        for user_id, count in counts.items():
+            for i in range(count):
+                await db.insert_record("g1", user_id, user_id, noon, f"{user_id}-{i}")
+        for i in range(10):
+            await db.insert_record("g1", "u3", "u3", noon - timedelta(days=3), f"old-{i}")
+        await db.flush()
+
+        today = await db.get_user_rank("g1", "u2", days=1)
+        assert today == {"msg_count": 3, "rank": 2, "members": 3, "percentile": 33.3}
+        # 内存榜单未加载时走 daily_counts 索引
+        db._live.clear()
+        assert await db.get_user_rank("g1", "u2", days=1) == today
+
+        assert (await db.get_user_rank("g1", "u3", days=7))["rank"] == 1
+        assert (await db.get_user_rank("g1", "u3", days=0))["msg_count"] == 11
+        assert (await db.get_user_rank("g1", "nobody", days=1))["rank"] is None
+        assert await db.get_user_stats("g1", "u3") == {"total_msgs": 11, "today_msgs": 1}
+
+        # 保留期清理后累计计数随之更新
+        await db.delete_old_records(days=2, pause=0)
+        assert await db.get_user_stats("g1", "u3") == {"total_msgs": 1, "today_msgs": 1}
+        assert (await db.get_user_rank("g1", "u1", days=0))["rank"] == 1
+        await db.close()
+
+    asyncio.run(run())
+
+
+def test_hierarchical_rollups_match_raw_records(tmp_path):
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"))
+        today = date.today()
+        noon = datetime.combine(today, time(12))
+        for i in range(400):
+            # 最近 400 天每天一条，按 7 天步长打乱顺序，u1 与 u2 交替
+            await db.insert_record("g1", f"u{i % 2 + 1}", "用户", noon - timedelta(days=i * 7 % 400), f"h{i}")
+        for i in range(5):
+            await db.insert_record("g1", "u3", "丙", noon, f"t{i}")
+        await db.flush()
+
+        async with db._reader() as conn:
+            async def raw(start_day):
+                cursor = await conn.execute('''
+                    SELECT u.user_id, COUNT(*) FROM chat_records r
+                    JOIN users u ON u.user_key = r.user_key
+                    WHERE r.ts >= ? GROUP BY 1
+                ''', (int(datetime.combine(start_day, time.min).timestamp()),))
+                return dict(await cursor.fetchall())
+
+            for days in (2, 9, 45, 100, 365):
+                ranking = await db.get_range_ranking("g1", days=days)
+                assert {r["user_id"]: r["msg_count"] for r in ranking} == await raw(today - timedelta(days=days - 1))
+
+            week = await db.get_period_ranking("g1", "week")
+            assert {r["user_id"]: r["msg_count"] for r in week} == await raw(today - timedelta(days=today.weekday()))
+            month = await db.get_period_ranking("g1", "month")
+            assert {r["user_id"]: r["msg_count"] for r in month} == await raw(today.replace(day=1))
+            total = await db.get_period_ranking("g1", "total", limit=2)
+            assert [(r["user_id"], r["msg_count"]) for r in total] == [("u1", 200), ("u2", 200)]
+
+            cursor = await conn.execute('SELECT * FROM weekly_counts UNION ALL SELECT * FROM monthly_counts ORDER BY 1, 2, 3')
+            incremental = await cursor.fetchall()
+
+        assert await db.get_first_day("g1") == (today - timedelta(days=399))
+        assert await db.get_first_day("nobody") is None
+
+        # 触发器逐级维护的结果与从 daily_counts 重建的一致
+        await db.rebuild_rollups()
+        async with db._reader() as conn:
+            cursor = await conn.execute('SELECT * FROM weekly_counts UNION ALL SELECT * FROM monthly_counts ORDER BY 1, 2, 3')
+            assert await cursor.fetchall() == incremental
+
+        # 保留期清理后周、月汇总只统计仍保留的日期（截止日当天仍保留）
+        await db.delete_old_records(days=30, pause=0)
+        ranking = await db.get_range_ranking("g1", days=365)
+        assert {r["user_id"]: r["msg_count"] for r in ranking} == {
+            r["user_id"]: r["msg_count"] for r in await db.get_range_ranking("g1", days=31)
+        }
+        await db.close()
+
+    asyncio.run(run())
+
+
+def test_large_groups_rank_from_count_index(tmp_path):
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"), topk_threshold=5)
+        now = datetime.now()
+        counts = {f"u{i}": 10 - i for i in range(4)}
+        for user_id, count in counts.items():
+            for i in range(count):
+                await db.insert_record("g1", user_id, user_id, now, f"{user_id}-{i}")
+        await db.flush()
+        assert [r["user_id"] for r in await db.get_range_ranking("g1", days=1, limit=2)] == ["u0", "u1"]
+        assert db._live.top("g1", _today_key(), 2) is not None
+
+        # 内存中的群发言人数超过阈值后释放，之后从索引取前几名
+        for user_id in ("u7", "u8", "u9"):
+            for i in range(8):
+                await db.insert_record("g1", user_id, user_id, now, f"{user_id}-{i}")
+        await db.flush()
+        assert db._live.top("g1", _today_key(), 3) is None
+        assert db._live.is_large("g1", _today_key())
+
+        ranking = await db.get_range_ranking("g1", days=1, limit=3)
+        # 计数并列时按 user_id 排序，与内存榜单一致
+        assert [(r["user_id"], r["msg_count"]) for r in ranking] == [("u0", 10), ("u1", 9), ("u2", 8)]
+        ranking = await db.get_range_ranking("g1", days=1, limit=5)
+        assert [r["user_id"] for r in ranking] == ["u0", "u1", "u2", "u7", "u8"]
+        assert db._metrics.snapshot()["counters"]["rank.indexed"] >= 2
+        await db.close()
+
+        # 重启后超大群不加载到内存
+        reopened = ChatDatabase(str(tmp_path / "chat.db"), topk_threshold=5)
+        await reopened._ensure_initialized()
+        assert len(reopened._live) == 0
+        ranking = await reopened.get_range_ranking("g1", days=1, limit=3)
+        assert [r["user_id"] for r in ranking] == ["u0", "u1", "u2"]
+        assert reopened._live.is_large("g1", _today_key())
+        await reopened.close()
+
+    asyncio.run(run())
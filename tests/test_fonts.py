@@ -0,0 +1,41 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from utils.fonts import FontResolver
+
+
+def _any_font_file():
+    for base in ("/usr/share/fonts", "/usr/local/share/fonts", str(Path.home())):
+        for pattern in ("*.ttf", "*.otf"):
+            found = next(Path(base).rglob(pattern), None) if Path(base).exists() else None
+            if found is not None:
+                return found
+    return None
+
+
+def test_resolves_once_and_memoizes_fonts(tmp_path, monkeypatch):
+    resolver = FontResolver(tmp_path / "fonts", tmp_path / "font_cache.json")
+    calls = []
+    monkeypatch.setattr(resolver, "_candidates", lambda: calls.append(1) or iter(()))
+
+    assert resolver.get_font(18) is resolver.get_font(18)
+    resolver.get_font(24)
+    assert calls == [1]
+
+
+def test_cached_path_skips_filesystem_scan(tmp_path, monkeypatch):
+    font = _any_font_file()
+    if font is None:
+        pytest.skip("no TTF/OTF font available")
+
+    cache_file = tmp_path / "font_cache.json"
+    first = FontResolver(tmp_path / "fonts", cache_file)
+    monkeypatch.setattr(first, "_candidates", lambda: iter([font]))
+    assert first.resolve_path() == str(font)
+    assert json.loads(cache_file.read_text(encoding="utf-8")) == {"path": str(font)}
+
+    restarted = FontResolver(tmp_path / "fonts", cache_file)
+    monkeypatch.setattr(restarted, "_candidates", lambda: pytest.fail("should not scan"))
+    assert restarted.resolve_path() == str(font)
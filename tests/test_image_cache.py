@@ -0,0 +1,44 @@
+import time
+
+from core.image_cache import ImageCache
+
+
+def test_lru_respects_byte_budget():
+    cache = ImageCache(max_bytes=300, ttl=60)
+    for i in range(5):
+        cache.put(f"k{i}", bytes(100))
+    # 每项 100 字节内容 + 136 字节 base64，只能留下一项
+    assert len(cache) == 1
+    assert cache.get("k4").content == bytes(100)
+    assert cache.get("k0") is None
+
+
+def test_key_is_stable_for_equal_payloads():
+    a = {"group_name": "群聊1", "day_count": "1", "list": [{"nickname": "甲", "qq": "1", "count": 2}]}
+    b = {"list": [{"count": 2, "qq": "1", "nickname": "甲"}], "day_count": "1", "group_name": "群聊1"}
+    assert ImageCache.make_key(a) == ImageCache.make_key(b)
+    assert ImageCache.make_key(a) != ImageCache.make_key({**a, "day_count": "7"})
+
+
+def test_disk_tier_survives_restart_and_expires(tmp_path):
+    cache = ImageCache(ttl=60, disk_dir=tmp_path)
+    cache.put("k", b"\x89PNG data")
+
+    restarted = ImageCache(ttl=60, disk_dir=tmp_path)
+    assert restarted.get("k").content == b"\x89PNG data"
+
+    expired = ImageCache(ttl=0.01, disk_dir=tmp_path)
+    time.sleep(0.02)
+    assert expired.get("k") is None
+    assert not (tmp_path / "k.png").exists()
+
+
+def test_disk_tier_uses_format_extension(tmp_path):
+    cache = ImageCache(ttl=60, disk_dir=tmp_path, image_format="webp")
+    cache.put("k", b"RIFF data")
+    assert (tmp_path / "k.webp").exists()
+
+    expired = ImageCache(ttl=0.01, disk_dir=tmp_path, image_format="webp")
+    time.sleep(0.02)
+    expired.prune_disk()
+    assert not (tmp_path / "k.webp").exists()
@@ -0,0 +1,135 @@
+import asyncio
+import json
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from database import ChatDatabase
+from database.importer import import_file, parse_time
+
+
+def _write_jsonl(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(row if isinstance(row, str) else json.dumps(row, ensure_ascii=False))
+            f.write("\n")
+
+
+def _noon(days_ago: int) -> int:
+    return int(datetime.combine(date.today() - timedelta(days=days_ago), time(12)).timestamp())
+
+
+def test_parse_time_accepts_common_formats():
+    ts = _noon(0)
+    assert parse_time(ts) == ts
+    assert parse_time(ts * 1000) == ts
+    assert parse_time(str(ts)) == ts
+    assert parse_time(datetime.fromtimestamp(ts).isoformat()) == ts
+
+
+def test_import_jsonl_dedups_and_rebuilds_rollups(tmp_path):
+    source = tmp_path / "export.jsonl"
+    _write_jsonl(source, [
+        {"group_id": "g1", "user_id": "u1", "user_name": "甲", "ts": _noon(40), "msg_id": "m1"},
+        {"group_id": "g1", "user_id": "u1", "user_name": "甲", "ts": _noon(40), "msg_id": "m1"},
+        {"group_id": "g1", "user_id": "u2", "ts": _noon(3), "msg_id": "m2"},
+        {"group_id": "g1", "user_id": "u2", "user_name": "乙", "time": datetime.fromtimestamp(_noon(0)).isoformat()},
+        "not json",
+        {"group_id": "g1", "ts": _noon(0)},
+    ])
+
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"))
+        stats = await import_file(db, source, batch_size=2)
+        assert stats == {"records": 6, "inserted": 3, "duplicates": 1, "invalid": 2}
+        assert not (tmp_path / "export.jsonl.import.json").exists()
+
+        ranking = await db.get_range_ranking("g1", days=60)
+        assert [(r["user_id"], r["user_name"], r["msg_count"]) for r in ranking] == [("u2", "乙", 2), ("u1", "甲", 1)]
+        assert (await db.get_period_ranking("g1", "total"))[0]["msg_count"] == 2
+
+        # 导入结束后触发器已恢复，新消息照常计入汇总表
+        await db.insert_record("g1", "u1", "甲", datetime.now(), "live-1")
+        await db.flush()
+        assert (await db.get_user_stats("g1", "u1"))["total_msgs"] == 2
+
+        # 再次导入同一文件不会重复计数
+        again = await import_file(db, source)
+        assert again["inserted"] == 0 and again["duplicates"] == 4
+        assert (await db.get_user_stats("g1", "u2"))["total_msgs"] == 2
+        await db.close()
+
+    asyncio.run(run())
+
+
+def test_import_resumes_after_interruption(tmp_path):
+    source = tmp_path / "export.csv"
+    lines = ["group_id,user_id,user_name,ts,msg_id"]
+    lines += [f"g1,u{i % 3},用户{i % 3},{_noon(i % 20)},m{i}" for i in range(50)]
+    source.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+    async def run():
+        db = ChatDatabase(str(tmp_path / "chat.db"))
+        import_batch = db.import_batch
+        calls = 0
+
+        async def failing(batch):
+            nonlocal calls
+            calls += 1
+            if calls == 3:
+                raise RuntimeError("中断")
+            return await import_batch(batch)
+
+        db.import_batch = failing
+        with pytest.raises(RuntimeError):
+            await import_file(db, source, batch_size=10)
+        checkpoint = json.loads((tmp_path / "export.csv.import.json").read_text(encoding="utf-8"))
+        assert checkpoint["records"] == 20
+
+        db.import_batch = import_batch
+        stats = await import_file(db, source, batch_size=10)
+        assert stats == {"records": 50, "inserted": 50, "duplicates": 0, "invalid": 0}
+        ranking = await db.get_range_ranking("g1", days=30)
+        assert sum(r["msg_count"] for r in ranking) == 50
+        await db.close()
+
+    asyncio.run(run())
+
+
+def test_finish_import_counts_records_written_during_rebuild(tmp_path, monkeypatch):
+    path = str(tmp_path / "chat.db")
+    source = tmp_path / "export.jsonl"
+    _write_jsonl(source, [
+        {"group_id": "g1", "user_id": f"u{i % 3}", "ts": _noon(0), "msg_id": f"m{i}"}
+        for i in range(9)
+    ])
+
+    async def run():
+        db = ChatDatabase(path)
+        live = ChatDatabase(path)
+        # 分块统计之间，插件进程写入了一条新消息
+        sleep = asyncio.sleep
+        written = []
+
+        async def write_between_chunks(delay):
+            if not written:
+                written.append(await live.insert_record("g1", "u0", "甲", datetime.now(), "live"))
+                await live.flush()
+            await sleep(0)
+
+        async def finish_import():
+            with monkeypatch.context() as patch:
+                patch.setattr("database.db.asyncio.sleep", write_between_chunks)
+                await ChatDatabase.finish_import(db, chunk_rows=4, pause=0)
+
+        db.finish_import = finish_import
+        await import_file(db, source, batch_size=4, progress_interval=60)
+
+        ranking = await db.get_range_ranking("g1", days=1)
+        await live.close()
+        await db.close()
+        return written, [(r["user_id"], r["msg_count"]) for r in ranking]
+
+    written, ranking = asyncio.run(run())
+    assert written == [True]
+    assert ranking == [("u0", 4), ("u1", 3), ("u2", 3)]
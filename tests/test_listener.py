@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from langbot_plugin.api.entities.builtin.platform import message as platform_message
+
+from components.event_listener.default import leading_parts, parse_command
+
+
+def test_parse_command_only_matches_leading_commands():
+    assert parse_command("7日发言榜") == ("rank", 7)
+    assert parse_command("  0日发言榜 ") == ("rank", 1)
+    assert parse_command("运行状态") == ("status", 0)
+    assert parse_command("今天吃什么") is None
+    assert parse_command("看看7日发言榜") is None
+    assert parse_command("运行状态怎么看") is None
+    assert parse_command("") is None
+    assert parse_command("我的发言") == ("my_stats", 1)
+    assert parse_command("7日我的发言 ") == ("my_stats", 7)
+    assert parse_command("我的发言好少") is None
+    assert parse_command("本周发言榜") == ("period_rank", "week")
+    assert parse_command("本月发言榜 ") == ("period_rank", "month")
+    assert parse_command("总发言榜") == ("period_rank", "total")
+    assert parse_command("本周发言榜呢") is None
+
+
+def test_leading_parts_skips_source_and_stops_at_first_component():
+    source = platform_message.Source(id=42, time=datetime.now())
+    chain = platform_message.MessageChain([source, platform_message.Plain(text="1日发言榜")])
+    assert leading_parts(chain.root) == ("42", "1日发言榜")
+
+    chain = platform_message.MessageChain([
+        source,
+        platform_message.At(target=1),
+        platform_message.Plain(text="1日发言榜"),
+    ])
+    assert leading_parts(chain.root) == ("42", None)
+    assert leading_parts([]) == (None, None)
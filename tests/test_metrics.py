@@ -0,0 +1,42 @@
+import asyncio
+import json
+
+from core.metrics import Histogram, Metrics, MetricsReporter
+
+
+def test_histogram_percentiles_use_fixed_buckets():
+    histogram = Histogram()
+    for _ in range(90):
+        histogram.record(0.001)
+    for _ in range(10):
+        histogram.record(0.5)
+
+    assert histogram.count == 100
+    assert 0.001 <= histogram.percentile(0.50) < 0.0015
+    assert 0.5 <= histogram.percentile(0.95) <= 0.75
+    assert histogram.percentile(0.99) == histogram.max == 0.5
+    assert len(histogram.counts) == len(Histogram().counts)
+
+
+def test_snapshot_contains_counters_gauges_and_latency(tmp_path):
+    metrics = Metrics()
+    metrics.incr("messages.ingested", 3)
+    metrics.gauge("db.pending", lambda: 7)
+    metrics.gauge("broken", lambda: 1 / 0)
+    with metrics.timer("db.query"):
+        pass
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"] == {"messages.ingested": 3}
+    assert snapshot["gauges"] == {"db.pending": 7}
+    assert snapshot["latency"]["db.query"]["count"] == 1
+    assert "db.query" in metrics.format_text()
+
+    async def run():
+        reporter = MetricsReporter(metrics, tmp_path / "metrics.json", interval=0.01)
+        reporter.start()
+        await asyncio.sleep(0.05)
+        await reporter.stop()
+
+    asyncio.run(run())
+    assert json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8"))["gauges"]["db.pending"] == 7
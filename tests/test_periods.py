@@ -0,0 +1,53 @@
+import random
+from datetime import date, timedelta
+
+from database.periods import day_key, period_start, split_range
+
+
+def _days(spans):
+    """展开拆分结果覆盖的日期键"""
+    covered = []
+    for level, lo, hi in spans:
+        if level == "month":
+            day = date(lo // 100, lo % 100, 1)
+            while day.year * 100 + day.month <= hi:
+                covered.append(day_key(day))
+                day += timedelta(days=1)
+        else:
+            day = date(lo // 10000, lo // 100 % 100, lo % 100)
+            last = date(hi // 10000, hi // 100 % 100, hi % 100)
+            if level == "week":
+                assert day.weekday() == 0 and last.weekday() == 0
+                last += timedelta(days=6)
+            while day <= last:
+                covered.append(day_key(day))
+                day += timedelta(days=1)
+    return covered
+
+
+def test_split_range_covers_each_day_once():
+    rng = random.Random(3)
+    for _ in range(500):
+        start = date(2024, 1, 1) + timedelta(days=rng.randrange(800))
+        end = start + timedelta(days=rng.randrange(400))
+        expected = [day_key(start + timedelta(days=i)) for i in range((end - start).days + 1)]
+        assert sorted(_days(split_range(start, end))) == expected
+
+
+def test_split_range_uses_coarse_levels():
+    spans = split_range(date(2024, 1, 1), date(2024, 12, 31))
+    assert spans == [("month", 202401, 202412)]
+    # 365 天只需一段月份加两端少量的整周与零散日期
+    assert len(split_range(date(2024, 3, 14), date(2025, 3, 13))) <= 7
+    assert split_range(date(2024, 5, 3), date(2024, 5, 1)) == []
+
+
+def test_split_range_treats_current_periods_as_whole():
+    today = date(2024, 5, 15)  # 周三
+    assert split_range(period_start("week", today), today, today) == [("week", 20240513, 20240513)]
+    assert split_range(period_start("month", today), today, today) == [("month", 202405, 202405)]
+    # 不包含今天的历史区间不能借用未结束的周期
+    assert split_range(date(2024, 5, 1), date(2024, 5, 14)) == [
+        ("day", 20240501, 20240505), ("week", 20240506, 20240506), ("day", 20240513, 20240514)
+    ]
+    assert period_start("total", today) is None
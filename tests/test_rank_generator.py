@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+import httpx
+
+from core.rank_generator import RankImageClient
+
+
+PNG = b'\x89PNG\r\n\x1a\nfake'
+
+
+def test_generate_returns_png_and_reuses_client():
+    seen = []
+
+    def handler(request: httpx.Request):
+        seen.append(request)
+        return httpx.Response(200, content=PNG)
+
+    async def run():
+        client = RankImageClient("https://example.invalid/api", "token", transport=httpx.MockTransport(handler))
+        members = [{"nickname": "甲", "qq": "1", "count": 3}]
+        assert await client.generate("群聊1", 1, members) == PNG
+        first = client._client
+        assert await client.generate("群聊1", 7, members) == PNG
+        assert client._client is first
+        await client.close()
+
+    asyncio.run(run())
+    form = dict(httpx.QueryParams(seen[1].content.decode()))
+    assert form["token"] == "token"
+    assert json.loads(form["data"])["day_count"] == "7"
+
+
+def test_generate_rejects_non_png_and_limits_concurrency():
+    active = 0
+    peak = 0
+
+    async def handler(request: httpx.Request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return httpx.Response(200, text="invalid token")
+
+    async def run():
+        client = RankImageClient("https://example.invalid/api", "", max_concurrency=2,
+                                 transport=httpx.MockTransport(handler))
+        results = await asyncio.gather(*(client.generate("群聊1", 1, []) for _ in range(6)))
+        await client.close()
+        return results
+
+    assert asyncio.run(run()) == [None] * 6
+    assert peak == 2
@@ -0,0 +1,140 @@
+import asyncio
+
+import httpx
+
+from core.rank_generator import RankImageClient
+from core.render_pool import RenderPool
+from core.renderer import RankRenderer
+from utils.image_generator import RankingImageGenerator
+
+
+MEMBERS = [
+    {"nickname": "测试用户一", "qq": "1", "count": 10},
+    {"nickname": "第二用户", "qq": "2", "count": 7},
+]
+
+
+def _client(status: int) -> RankImageClient:
+    transport = httpx.MockTransport(lambda request: httpx.Response(status, text="down"))
+    return RankImageClient("https://example.invalid/api", "", transport=transport)
+
+
+def test_local_backend_accepts_listener_members():
+    async def run():
+        renderer = RankRenderer("local", _client(200))
+        image = await renderer.render("群聊1", 7, MEMBERS)
+        await renderer.close()
+        return image
+
+    assert asyncio.run(run()).startswith(b'\x89PNG')
+
+
+def test_remote_fallback_renders_locally_when_api_fails():
+    async def run():
+        fallback = RankRenderer("remote_fallback", _client(500))
+        remote_only = RankRenderer("remote", _client(500))
+        results = (await fallback.render("群聊1", 1, MEMBERS), await remote_only.render("群聊1", 1, MEMBERS))
+        await fallback.close()
+        await remote_only.close()
+        return results
+
+    fallback_image, remote_image = asyncio.run(run())
+    assert fallback_image.startswith(b'\x89PNG')
+    assert remote_image is None
+
+
+def test_render_pool_replaces_crashed_worker():
+    async def run():
+        pool = RenderPool(workers=1, job_timeout=30)
+        pool.start()
+        await pool.wait_ready()
+        first = await pool.render(MEMBERS, "今日发言排行榜", "群聊1")
+        (worker,) = pool._workers
+        worker.process.kill()
+        await asyncio.sleep(0.2)
+        # 空闲时退出的进程在分配任务前被替换
+        recovered = await pool.render(MEMBERS, "今日发言排行榜", "群聊1")
+        (replacement,) = pool._workers
+        await pool.close()
+        return first, recovered, worker.process.pid != replacement.process.pid
+
+    first, recovered, replaced = asyncio.run(run())
+    assert first.startswith(b'\x89PNG')
+    assert recovered.startswith(b'\x89PNG')
+    assert replaced
+
+
+def test_local_backend_uses_render_pool():
+    async def run():
+        renderer = RankRenderer("local", _client(200), RenderPool(workers=1))
+        image = await renderer.render("群聊1", 1, MEMBERS)
+        await renderer.close()
+        return image
+
+    assert asyncio.run(run()).startswith(b'\x89PNG')
+
+
+def test_render_pool_timeout_excludes_queue_wait():
+    async def run():
+        # 预热后单次渲染远小于超时，排队等待的时间不计入超时
+        pool = RenderPool(workers=1, job_timeout=0.5)
+        pool.start()
+        await pool.wait_ready()
+        images = await asyncio.gather(*(
+            pool.render(MEMBERS, "今日发言排行榜", "群聊1") for _ in range(8)
+        ))
+        await pool.close()
+        return images
+
+    assert all(image and image.startswith(b'\x89PNG') for image in asyncio.run(run()))
+
+
+def test_render_pool_timeout_recycles_only_the_stuck_worker():
+    async def run():
+        pool = RenderPool(workers=2, job_timeout=30)
+        pool.start()
+        await pool.wait_ready()
+        before = {worker.process.pid for worker in pool._workers}
+        pool.job_timeout = 0.0001
+        timed_out = await pool.render(MEMBERS, "今日发言排行榜", "群聊1")
+        pool.job_timeout = 30
+        await pool.wait_ready()
+        after = {worker.process.pid for worker in pool._workers}
+        recovered = await asyncio.gather(*(
+            pool.render(MEMBERS, "今日发言排行榜", "群聊1") for _ in range(4)
+        ))
+        await pool.close()
+        return timed_out, before, after, recovered
+
+    timed_out, before, after, recovered = asyncio.run(run())
+    assert timed_out is None
+    assert len(after) == 2 and len(before & after) == 1
+    assert all(image.startswith(b'\x89PNG') for image in recovered)
+
+
+def test_base_layers_are_reused_and_match_full_redraw():
+    generator = RankingImageGenerator()
+    ranking = [{"user_name": f"用户{i}", "msg_count": 50 - i} for i in range(5)]
+
+    generator.use_layer_cache = False
+    expected = generator.generate_ranking_image(ranking, "今日发言排行榜", "2026-01-01")
+    generator.use_layer_cache = True
+    first = generator.generate_ranking_image(ranking, "今日发言排行榜", "2026-01-01")
+    second = generator.generate_ranking_image(ranking[::-1], "今日发言排行榜", "2026-01-01")
+
+    assert first == expected
+    assert second != first
+    assert len(generator._layers) == 1
+
+
+def test_output_encodings():
+    generator = RankingImageGenerator()
+    ranking = [{"user_name": f"用户{i}", "msg_count": 50 - i} for i in range(10)]
+
+    png = generator.generate_ranking_image(ranking, image_format="png")
+    palette = generator.generate_ranking_image(ranking, image_format="palette")
+    webp = generator.generate_ranking_image(ranking, image_format="webp")
+
+    assert png.startswith(b'\x89PNG') and palette.startswith(b'\x89PNG')
+    assert webp[:4] == b'RIFF' and webp[8:12] == b'WEBP'
+    assert len(palette) < len(png)
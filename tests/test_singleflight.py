@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from core.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "image"
+
+    async def run():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.do(("g1", 1), work) for _ in range(5)))
+        assert len(flights) == 0
+        # 完成后不缓存，再次调用会重新执行
+        await flights.do(("g1", 1), work)
+        return results
+
+    assert asyncio.run(run()) == ["image"] * 5
+    assert len(calls) == 2
+
+
+def test_errors_reach_all_waiters_and_are_not_cached():
+    attempts = []
+
+    async def fail():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("render failed")
+
+    async def run():
+        flights = SingleFlight()
+        results = await asyncio.gather(*(flights.do("k", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        with pytest.raises(RuntimeError):
+            await flights.do("k", fail)
+
+    asyncio.run(run())
+    assert len(attempts) == 2
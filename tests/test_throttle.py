@@ -0,0 +1,49 @@
+from core.throttle import CommandThrottle
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_user_limit_refills_over_time():
+    clock = _Clock()
+    throttle = CommandThrottle(group_per_minute=0, user_per_minute=2, clock=clock)
+
+    assert throttle.allow("g1", "u1")
+    assert throttle.allow("g1", "u1")
+    assert not throttle.allow("g1", "u1")
+    # 其他用户不受影响
+    assert throttle.allow("g1", "u2")
+
+    clock.now += 30
+    assert throttle.allow("g1", "u1")
+    assert not throttle.allow("g1", "u1")
+
+
+def test_group_limit_is_shared_and_rejections_cost_nothing():
+    clock = _Clock()
+    throttle = CommandThrottle(group_per_minute=3, user_per_minute=1, clock=clock)
+
+    assert throttle.allow("g1", "u1")
+    # 用户桶已空，被拒绝的请求不扣除群桶的令牌
+    assert not throttle.allow("g1", "u1")
+    assert not throttle.allow("g1", "u1")
+    assert throttle.allow("g1", "u2")
+    assert throttle.allow("g1", "u3")
+    assert not throttle.allow("g1", "u4")
+    assert throttle.allow("g2", "u4")
+
+
+def test_idle_buckets_are_pruned():
+    clock = _Clock()
+    throttle = CommandThrottle(group_per_minute=0, user_per_minute=1, max_buckets=10, clock=clock)
+    for i in range(10):
+        throttle.allow("g1", str(i))
+    clock.now += 60
+    for i in range(10, 20):
+        throttle.allow("g1", str(i))
+    assert len(throttle) == 10
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from PIL import ImageFont
+from typing import Dict, Optional, Tuple, Union
+from pathlib import Path
+import json
+import shutil
+import subprocess
+import threading
+
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+
+# 系统字体目录中按文件名识别中文字体的关键字
+_CJK_KEYWORDS = ("noto", "sourcehan", "source-han", "simhei", "wenquanyi", "arphic", "msyh", "simsun")
+_FONT_SUFFIXES = (".ttf", ".otf", ".ttc")
+
+FontType = Union[ImageFont.FreeTypeFont, ImageFont.ImageFont]
+
+
+class FontResolver:
+    """
+    进程内共享的中文字体查找与字体对象缓存。
+
+    字体文件只查找一次，结果写入 cache_file，之后启动直接复用，
+    不再调用 fc-list 或遍历系统字体目录；字体对象按 (路径, 字号) 缓存。
+    """
+
+    def __init__(self, font_dir: Path, cache_file: Optional[Path] = None):
+        self.font_dir = Path(font_dir)
+        self.cache_file = Path(cache_file) if cache_file else None
+        self._lock = threading.Lock()
+        self._resolved = False
+        self._path: Optional[str] = None
+        self._fonts: Dict[Tuple[Optional[str], int], FontType] = {}
+
+    @staticmethod
+    def _usable(path: Path) -> bool:
+        try:
+            if not path.is_file() or path.stat().st_size == 0:
+                return False
+            ImageFont.truetype(str(path), 12)
+            return True
+        except Exception:
+            return False
+
+    def _read_cache(self) -> Optional[str]:
+        if self.cache_file is None:
+            return None
+        try:
+            path = json.loads(self.cache_file.read_text(encoding="utf-8")).get("path")
+        except (OSError, ValueError):
+            return None
+        if path and Path(path).is_file():
+            return path
+        return None
+
+    def _write_cache(self, path: str):
+        if self.cache_file is None:
+            return
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            self.cache_file.write_text(json.dumps({"path": path}, ensure_ascii=False), encoding="utf-8")
+        except OSError as e:
+            print(f"⚠️ 写入字体缓存失败: {e}")
+
+    def _candidates(self):
+        # 优先使用插件内的字体文件
+        yield self.font_dir / "NotoSansCJK-Regular.otf"
+
+        # 尝试使用系统字体（fontconfig / fc-list）查找支持中文的字体
+        fc_list = shutil.which("fc-list")
+        if fc_list:
+            try:
+                out = subprocess.check_output(
+                    [fc_list, ":lang=zh", "-f", "%{file}\n"],
+                    universal_newlines=True,
+                    timeout=10
+                )
+                for line in out.splitlines():
+                    if line.strip():
+                        yield Path(line.strip())
+            except Exception as e:
+                print(f"fc-list call failed: {e}")
+
+        # 搜索常见系统字体目录中的字体文件作为最后手段
+        for d in ("/usr/share/fonts", "/usr/local/share/fonts", Path.home() / ".local" / "share" / "fonts"):
+            base = Path(d)
+            if not base.exists():
+                continue
+            try:
+                for p in base.rglob("*"):
+                    if p.suffix.lower() in _FONT_SUFFIXES and any(k in p.name.lower() for k in _CJK_KEYWORDS):
+                        yield p
+            except OSError:
+                continue
+
+    def resolve_path(self) -> Optional[str]:
+        """返回可用的中文字体路径，找不到时返回 None"""
+        with self._lock:
+            if self._resolved:
+                return self._path
+
+            # 插件自带字体总是优先，其次是上次启动找到的字体
+            bundled = self.font_dir / "NotoSansCJK-Regular.otf"
+            path = str(bundled) if self._usable(bundled) else self._read_cache()
+            if path is None:
+                path = next((str(p) for p in self._candidates() if self._usable(p)), None)
+                if path is not None:
+                    self._write_cache(path)
+
+            if path is None:
+                print("No usable TTF/OTF font found for Chinese text; using default font (may not support Chinese)")
+            else:
+                print(f"Using font: {path}")
+            self._path = path
+            self._resolved = True
+            return path
+
+    def get_font(self, size: int) -> FontType:
+        path = self.resolve_path()
+        key = (path, size)
+        font = self._fonts.get(key)
+        if font is None:
+            if path is None:
+                font = ImageFont.load_default()
+            else:
+                font = ImageFont.truetype(path, size)
+            self._fonts[key] = font
+        return font
+
+
+_resolver: Optional[FontResolver] = None
+_resolver_lock = threading.Lock()
+
+
+def get_font_resolver() -> FontResolver:
+    """进程内唯一的字体查找器"""
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = FontResolver(
+                PLUGIN_DIR / "assets" / "fonts",
+                PLUGIN_DIR / "data" / "font_cache.json"
+            )
+        return _resolver
@@ -4,9 +4,17 @@ from PIL import Image, ImageDraw, ImageFont
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from pathlib import Path
+from collections import OrderedDict
 import io
-import shutil
-import subprocess
+import threading
+
+from .fonts import get_font_resolver
+
+
+# png: 真彩色 PNG；palette: 量化为调色板的 PNG；webp: 无损 WebP
+IMAGE_FORMATS = ("png", "palette", "webp")
+# 各输出编码对应的文件扩展名
+IMAGE_EXTENSIONS = {"png": "png", "palette": "png", "webp": "webp"}
 
 
 class RankingImageGenerator:
@@ -24,25 +32,27 @@ class RankingImageGenerator:
         self.gold_color = "#ffd700"
         self.silver_color = "#c0c0c0"
         self.bronze_color = "#cd7f32"
+
+        # 预渲染的静态底图，按 (条目数, 主题) 缓存；每次只在副本上绘制变化的部分
+        self.use_layer_cache = True
+        self.max_cached_layers = 16
+        self._layers: OrderedDict[tuple, Image.Image] = OrderedDict()
+        self._layers_lock = threading.Lock()
+
+        # 输出编码：排行榜只有少量纯色，调色板 PNG 体积通常只有真彩色的几分之一
+        self.image_format = "palette"
+        self.compress_level = 6
+        self.palette_colors = 64
+        self.webp_method = 4
         
         self._init_fonts()
 
     def _init_fonts(self):
-        # 使用绝对路径来确保字体文件能够被正确找到
+        # 字体路径与字体对象由进程内共享的 FontResolver 查找并缓存
         self.plugin_dir = Path(__file__).resolve().parent.parent
         self.font_dir = self.plugin_dir / "assets" / "fonts"
-        self.font_dir.mkdir(parents=True, exist_ok=True)
-        
-        print(f"Plugin directory: {self.plugin_dir}")
-        print(f"Font directory: {self.font_dir}")
-        print(f"Font directory exists: {self.font_dir.exists()}")
-        
-        # 列出字体目录中的所有文件
-        if self.font_dir.exists():
-            print("Files in font directory:")
-            for file in self.font_dir.iterdir():
-                print(f"  - {file.name}, size: {file.stat().st_size}")
-        
+        self._fonts = get_font_resolver()
+
         self.title_font = self._load_font(28)
         self.rank_font = self._load_font(24)
         self.name_font = self._load_font(18)
@@ -50,73 +60,7 @@ class RankingImageGenerator:
         self.date_font = self._load_font(14)
 
     def _load_font(self, size: int) -> ImageFont.FreeTypeFont:
-        # 优先使用插件内的字体文件
-        font_paths = [
-            self.font_dir / "NotoSansCJK-Regular.otf",
-        ]
-
-        print(f"Loading font of size {size}...")
-
-        for path in font_paths:
-            path_obj = Path(path)
-            print(f"Trying font: {path_obj}")
-            print(f"Exists: {path_obj.exists()}")
-            if path_obj.exists() and path_obj.stat().st_size > 0:
-                try:
-                    font = ImageFont.truetype(str(path_obj), size)
-                    print(f"Successfully loaded font: {path_obj}")
-                    return font
-                except Exception as e:
-                    print(f"Error loading font {path_obj}: {e}")
-
-        # 尝试使用系统字体（fontconfig / fc-list）查找支持中文的字体
-        try:
-            fc_list = shutil.which("fc-list")
-            if fc_list:
-                try:
-                    out = subprocess.check_output([fc_list, ":lang=zh", "-f", "%{file}\n"], universal_newlines=True)
-                    for line in out.splitlines():
-                        p = Path(line.strip())
-                        if p.exists():
-                            try:
-                                font = ImageFont.truetype(str(p), size)
-                                print(f"Loaded system font via fc-list: {p}")
-                                return font
-                            except Exception:
-                                continue
-                except Exception as e:
-                    print(f"fc-list call failed: {e}")
-        except Exception as e:
-            print(f"Error checking fc-list: {e}")
-
-        # 搜索常见系统字体目录中的字体文件作为最后手段
-        common_dirs = [
-            "/usr/share/fonts",
-            "/usr/local/share/fonts",
-            str(Path.home() / ".local" / "share" / "fonts"),
-        ]
-        keywords = ("noto", "sourcehan", "source-han", "simhei", "wenquanyi", "arphic", "msyh", "simsun")
-        for d in common_dirs:
-            try:
-                base = Path(d)
-                if not base.exists():
-                    continue
-                for p in base.rglob("*"):
-                    if p.suffix.lower() in (".ttf", ".otf", ".ttc"):
-                        name = p.name.lower()
-                        if any(k in name for k in keywords):
-                            try:
-                                font = ImageFont.truetype(str(p), size)
-                                print(f"Loaded font from {p}")
-                                return font
-                            except Exception:
-                                continue
-            except Exception:
-                continue
-
-        # 最后回退到默认字体（注意：默认字体可能不支持中文）
-        print("No usable TTF/OTF font found for Chinese text; using default font (may not support Chinese)")
-        return ImageFont.load_default()
+        return self._fonts.get_font(size)
 
     def _draw_rounded_rect(
         self,
@@ -169,6 +113,11 @@ class RankingImageGenerator:
         msg_count: int,
         max_count: int
     ):
+        self._draw_rank_item_static(draw, y_offset, rank)
+        self._draw_rank_item_dynamic(draw, y_offset, rank, user_name, msg_count, max_count)
+
+    def _draw_rank_item_static(self, draw: ImageDraw.ImageDraw, y_offset: int, rank: int):
+        # 卡片、边框、奖牌、名次、空进度条和“条”字只与名次有关
         style = self._get_rank_style(rank)
         
         card_x = self.padding
@@ -217,6 +166,38 @@ class RankingImageGenerator:
                 anchor="mm"
             )
         
+        bar_x = card_x + 70
+        bar_y = y_offset + 45
+        draw.rounded_rectangle(
+            (bar_x, bar_y, bar_x + 180, bar_y + 12),
+            radius=6,
+            fill="#333344"
+        )
+        
+        count_x = card_x + card_width - 25
+        count_y = y_offset + (self.item_height - 10) // 2
+        draw.text(
+            (count_x, count_y + 20),
+            "条",
+            font=self.count_font,
+            fill="#888888",
+            anchor="rm"
+        )
+
+    def _draw_rank_item_dynamic(
+        self,
+        draw: ImageDraw.ImageDraw,
+        y_offset: int,
+        rank: int,
+        user_name: str,
+        msg_count: int,
+        max_count: int
+    ):
+        style = self._get_rank_style(rank)
+        
+        card_x = self.padding
+        card_width = self.width - self.padding * 2
+        
         name_x = card_x + 70
         name_y = y_offset + 18
         display_name = user_name[:12] + "..." if len(user_name) > 12 else user_name
@@ -232,12 +213,6 @@ class RankingImageGenerator:
         bar_width = 180
         bar_height = 12
         
-        draw.rounded_rectangle(
-            (bar_x, bar_y, bar_x + bar_width, bar_y + bar_height),
-            radius=6,
-            fill="#333344"
-        )
-        
         if max_count > 0:
             progress = min(msg_count / max_count, 1.0)
             progress_width = int(bar_width * progress)
@@ -258,25 +233,113 @@ class RankingImageGenerator:
             fill=self.accent_color if not style["highlight"] else style["medal_color"],
             anchor="rm"
         )
+
+    def _theme_key(self) -> tuple:
+        return (
+            self.width, self.item_height, self.header_height, self.footer_height, self.padding,
+            self.bg_color, self.card_bg, self.text_color, self.accent_color,
+            self.gold_color, self.silver_color, self.bronze_color,
+            id(self.rank_font), id(self.count_font), id(self.date_font), id(self.name_font)
+        )
+
+    def _render_base_layer(self, num_items: int, empty: bool) -> Image.Image:
+        height = self.header_height + (self.item_height * num_items) + self.footer_height
+        image = Image.new("RGB", (self.width, height), self.bg_color)
+        draw = ImageDraw.Draw(image)
         
         draw.text(
-            (count_x, count_y + 20),
-            "条",
+            (self.width // 2, 95),
+            "━" * 20,
+            font=self.date_font,
+            fill="#333344",
+            anchor="mm"
+        )
+        
+        if empty:
+            y_offset = self.header_height + 20
+            draw.text(
+                (self.width // 2, y_offset + 30),
+                "暂无发言记录",
+                font=self.name_font,
+                fill="#666666",
+                anchor="mm"
+            )
+        else:
+            for i in range(num_items):
+                self._draw_rank_item_static(draw, self.header_height + (i * self.item_height), i + 1)
+        
+        footer_y = height - 35
+        draw.text(
+            (self.width // 2, footer_y),
+            f"共 {0 if empty else num_items} 位活跃成员",
             font=self.count_font,
-            fill="#888888",
-            anchor="rm"
+            fill="#666666",
+            anchor="mm"
         )
+        return image
+
+    def _get_base_layer(self, num_items: int, empty: bool) -> Image.Image:
+        """返回底图的副本，可直接在上面绘制"""
+        if not self.use_layer_cache:
+            return self._render_base_layer(num_items, empty)
+        
+        key = (num_items, empty, self._theme_key())
+        with self._layers_lock:
+            base = self._layers.get(key)
+            if base is not None:
+                self._layers.move_to_end(key)
+                return base.copy()
+        
+        base = self._render_base_layer(num_items, empty)
+        with self._layers_lock:
+            self._layers[key] = base
+            while len(self._layers) > self.max_cached_layers:
+                self._layers.popitem(last=False)
+        return base.copy()
+
+    @staticmethod
+    def _item_fields(item: Dict[str, Any]) -> tuple:
+        # 同时支持数据库查询结果 {"user_name", "msg_count"}
+        # 与远程 API 成员格式 {"nickname", "qq", "count"}
+        if "user_name" in item:
+            return item["user_name"], item["msg_count"]
+        return item.get("nickname") or str(item.get("qq", "")), item["count"]
+
+    def encode_image(self, image: Image.Image, image_format: Optional[str] = None) -> bytes:
+        image_format = image_format or self.image_format
+        buffer = io.BytesIO()
+        if image_format == "palette":
+            image.quantize(
+                colors=self.palette_colors,
+                method=Image.Quantize.FASTOCTREE
+            ).save(buffer, format="PNG", compress_level=self.compress_level)
+        elif image_format == "webp":
+            image.save(buffer, format="WEBP", lossless=True, method=self.webp_method)
+        elif image_format == "png":
+            image.save(buffer, format="PNG", compress_level=self.compress_level)
+        else:
+            raise ValueError(f"不支持的图片格式: {image_format}")
+        return buffer.getvalue()
 
     def generate_ranking_image(
         self,
         ranking_data: List[Dict[str, Any]],
         title: str = "今日发言排行榜",
-        date_str: Optional[str] = None
+        date_str: Optional[str] = None,
+        image_format: Optional[str] = None
     ) -> bytes:
+        return self.encode_image(self.draw_ranking_image(ranking_data, title, date_str), image_format)
+
+    def draw_ranking_image(
+        self,
+        ranking_data: List[Dict[str, Any]],
+        title: str = "今日发言排行榜",
+        date_str: Optional[str] = None
+    ) -> Image.Image:
+        """绘制排行榜图片，不做编码"""
         num_items = len(ranking_data) if ranking_data else 1
-        height = self.header_height + (self.item_height * num_items) + self.footer_height
         
-        image = Image.new("RGB", (self.width, height), self.bg_color)
+        image = self._get_base_layer(num_items, not ranking_data)
         draw = ImageDraw.Draw(image)
         
         draw.text(
@@ -287,72 +350,36 @@ class RankingImageGenerator:
             anchor="mm"
         )
         
-        if date_str:
-            draw.text(
-                (self.width // 2, 70),
-                date_str,
-                font=self.date_font,
-                fill="#888888",
-                anchor="mm"
-            )
-        else:
-            draw.text(
-                (self.width // 2, 70),
-                datetime.now().strftime("%Y-%m-%d"),
-                font=self.date_font,
-                fill="#888888",
-                anchor="mm"
-            )
-        
         draw.text(
-            (self.width // 2, 95),
-            "━" * 20,
+            (self.width // 2, 70),
+            date_str or datetime.now().strftime("%Y-%m-%d"),
             font=self.date_font,
-            fill="#333344",
+            fill="#888888",
             anchor="mm"
         )
         
-        if not ranking_data:
-            y_offset = self.header_height + 20
-            draw.text(
-                (self.width // 2, y_offset + 30),
-                "暂无发言记录",
-                font=self.name_font,
-                fill="#666666",
-                anchor="mm"
-            )
-        else:
-            max_count = ranking_data[0]["msg_count"] if ranking_data else 1
+        if ranking_data:
+            items = [self._item_fields(item) for item in ranking_data]
+            max_count = items[0][1] if items else 1
             
-            for i, item in enumerate(ranking_data):
+            for i, (user_name, msg_count) in enumerate(items):
                 y_offset = self.header_height + (i * self.item_height)
-                self._draw_rank_item(
+                self._draw_rank_item_dynamic(
                     draw,
                     y_offset,
                     i + 1,
-                    item["user_name"],
-                    item["msg_count"],
+                    user_name,
+                    msg_count,
                     max_count
                 )
         
-        footer_y = height - 35
-        draw.text(
-            (self.width // 2, footer_y),
-            f"共 {len(ranking_data)} 位活跃成员",
-            font=self.count_font,
-            fill="#666666",
-            anchor="mm"
-        )
-        
-        buffer = io.BytesIO()
-        image.save(buffer, format="PNG", quality=95)
-        buffer.seek(0)
-        return buffer.getvalue()
+        return image
 
     def generate_image_bytes(
         self,
         ranking_data: List[Dict[str, Any]],
         title: str = "今日发言排行榜",
-        date_str: Optional[str] = None
+        date_str: Optional[str] = None,
+        image_format: Optional[str] = None
     ) -> bytes:
-        return self.generate_ranking_image(ranking_data, title, date_str)
+        return self.generate_ranking_image(ranking_data, title, date_str, image_format)